@@ -7,35 +7,285 @@
 
 import argparse
 import base64
+import glob
 import hashlib
+import ipaddress
 import json
 import logging
 import os
 import requests
+import re
 import sys
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import Enum
 from Crypto.Cipher import AES
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
 from urllib.parse import urlencode
-from simplejson.errors import JSONDecodeError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock file, sessions are not serialized
+    fcntl = None
+
+class RequestStats(object):
+    """Rolling timings per endpoint and phase, plus request results.
+
+    Phases of a request: encrypt (AES), sign (RSA, both skipped for cached
+    envelopes), roundtrip (HTTP incl. connect), decrypt (AES), parse (JSON)
+    and total.  A whole login is recorded as endpoint 'login'.  Only the
+    last ``window`` samples are kept.
+    """
+
+    WINDOW = 200
+
+    def __init__(self, window=WINDOW):
+        self._window = window
+        self._samples = {}
+        self._results = {}
+
+    def add(self, endpoint, phase, seconds):
+        samples = self._samples.get((endpoint, phase))
+        if samples is None:
+            # setdefault: another thread may have added it meanwhile
+            samples = self._samples.setdefault((endpoint, phase), deque(maxlen=self._window))
+        samples.append(seconds)
+
+    def request(self, endpoint, seconds, ok):
+        self.add(endpoint, 'total', seconds)
+        results = self._results.get(endpoint)
+        if results is None:
+            results = self._results.setdefault(endpoint, deque(maxlen=self._window))
+        results.append(bool(ok))
+
+    def last(self, endpoint, phase='total'):
+        samples = self._samples.get((endpoint, phase))
+        return samples[-1] if samples else None
+
+    def percentile(self, endpoint, p, phase='total'):
+        samples = self._samples.get((endpoint, phase))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    def error_rate(self, exclude=()):
+        """Share of failed requests (0..1) over the window, None without data."""
+        total = failed = 0
+        for endpoint, results in list(self._results.items()):
+            if endpoint not in exclude:
+                total += len(results)
+                failed += results.count(False)
+        return failed / total if total else None
+
+    def as_dict(self):
+        out = {}
+        for (endpoint, phase), samples in list(self._samples.items()):
+            entry = out.setdefault(endpoint, {})
+            entry[phase] = {
+                'p50_ms': round(self.percentile(endpoint, 50, phase) * 1000, 2),
+                'p95_ms': round(self.percentile(endpoint, 95, phase) * 1000, 2),
+                'samples': len(samples),
+            }
+        for endpoint, results in list(self._results.items()):
+            out.setdefault(endpoint, {})['errors'] = results.count(False)
+        return out
+
+
+class FetchResult(object):
+    """One endpoint of TL_WPA4220.fetch(): value or error, and its duration.
+
+    A request that timed out has a RequestTimeout as error (timed_out).
+    """
+
+    __slots__ = ('name', 'value', 'error', 'seconds')
+
+    def __init__(self, name, value=None, error=None, seconds=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def timed_out(self):
+        return isinstance(self.error, TL_WPA4220.RequestTimeout)
+
+    def __repr__(self):
+        return 'FetchResult({!r}, ok={}, {:.1f}ms)'.format(
+            self.name, self.ok, self.seconds * 1000)
+
+
+class FetchBundle(object):
+    """Results of TL_WPA4220.fetch() by endpoint name, in request order."""
+
+    def __init__(self, results, seconds):
+        self._results = {r.name: r for r in results}
+        self.seconds = seconds
+
+    def __iter__(self):
+        return iter(self._results.values())
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, name):
+        return name in self._results
+
+    def __getitem__(self, name):
+        return self._results[name]
+
+    def value(self, name, default=None):
+        result = self._results.get(name)
+        return result.value if result is not None and result.ok else default
+
+    @property
+    def values(self):
+        return {r.name: r.value for r in self if r.ok}
+
+    @property
+    def errors(self):
+        return {r.name: r.error for r in self if not r.ok}
+
+    def as_dict(self):
+        return {r.name: {
+            'ok': r.ok,
+            'ms': round(r.seconds * 1000, 2),
+            'error': str(r.error) if r.error is not None else None,
+        } for r in self}
+
+
+class DeviceLock(object):
+    """Lock file serializing the admin sessions of one device on this host.
+
+    The device accepts a single admin session, so the CLI and the Home
+    Assistant integration hold this flock() while they use theirs.  A
+    process waiting for the lock leaves a marker next to it; the holder
+    checks contended() and logs out before releasing instead of keeping
+    its session open.  The lock goes away with the process, so a crashed
+    holder never blocks the device.
+    """
+
+    def __init__(self, ip, directory=None):
+        directory = directory or os.environ.get('TL_WPA4220_LOCK_DIR') or tempfile.gettempdir()
+        name = re.sub(r'[^0-9A-Za-z.-]', '_', ip)
+        self.path = os.path.join(directory, 'tl_wpa4220-{}.lock'.format(name))
+        self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """Take the lock if it is free, never blocks."""
+        if fcntl is None or self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def acquire(self, timeout=None, poll_interval=0.1):
+        """Wait up to timeout seconds (None: forever), True once we hold it."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.waiting():
+            while not self.try_acquire():
+                if end is not None and time.monotonic() >= end:
+                    return False
+                time.sleep(poll_interval)
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def waiting(self):
+        """Context manager marking this process as waiting for the lock."""
+        return _LockWaiter(self.path)
+
+    def contended(self):
+        """True if another process waits for the lock."""
+        return fcntl is not None and bool(glob.glob(glob.escape(self.path) + '.wait-*'))
+
+    def holder(self):
+        """pid of the process holding the lock (None if unknown)."""
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+
+class _LockWaiter(object):
+    def __init__(self, lock_path):
+        self._path = '{}.wait-{}-{}'.format(lock_path, os.getpid(), id(self))
+
+    def __enter__(self):
+        if fcntl is not None:
+            try:
+                os.close(os.open(self._path, os.O_WRONLY | os.O_CREAT, 0o666))
+            except OSError:
+                pass
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
 
 class TL_WPA4220(object):
     # From tpEncrypt.js:
     KEY_LEN = 128 / 8
     CRYPTO_MODE = AES.MODE_CBC
-
-    def __init__(self, ip):
+    DEFAULT_POOL_SIZE = 4
+    DEFAULT_PARALLEL = 4  # requests of one fetch() at the same time
+    DEFAULT_TIMEOUT = 15.0  # seconds, per request
+    RSA_BLOCK_LEN = 64
+    RSA_CACHE_SIZE = 64
+    ENVELOPE_CACHE_SIZE = 64
+
+    def __init__(self, ip, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, stats=None,
+                 timeout=DEFAULT_TIMEOUT):
         self._ip = ip
+        # may be shared by the clients of one device (see session.py)
+        self.stats = stats if stats is not None else RequestStats()
+        # Some firmwares drop kept-alive connections; keep_alive is cleared
+        # on the first such failure and we fall back to one TCP connection
+        # per request ("Connection: close") like the web UI does.
+        self._keep_alive = keep_alive
+        self._pool_size = max(1, int(pool_size))
+        self._http_session = None
         self._password_hash = None
         self._seq = None
         self._e = None
         self._n = None
-        self._timeout = 15*1000
+        self._rsa_cache = {}
+        self._envelope_cache = {}
+        self._unsupported = set()
+        self._timeout = timeout
+        self._deadline = None
+        # pool creation and the keep-alive fallback, see fetch()
+        self._lock = threading.Lock()
+        # No handler here: the logger is shared by all instances, the CLI
+        # installs one (install_cli_logging), Home Assistant has its own
         self._logger = logging.getLogger(__class__.__name__)
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(logging.Formatter(
-            '[%(levelname)s] %(name)s: %(funcName)s: %(message)s'))
-        self._logger.addHandler(console_handler)
 
     @property
     def ip(self):
@@ -45,11 +295,59 @@ class TL_WPA4220(object):
     def logger(self):
         return self._logger
 
+    @property
+    def keep_alive(self):
+        return self._keep_alive
+
+    def set_deadline(self, deadline):
+        """time.monotonic() by which all requests must be done (None: no limit).
+
+        Each request gets the remaining time (at most the per-request
+        timeout, RequestTimeout if it runs out); requests not started
+        before the deadline raise DeadlineExceeded.
+        """
+        self._deadline = deadline
+
+    def _request_timeout(self):
+        if self._deadline is None:
+            return self._timeout
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise TL_WPA4220.DeadlineExceeded()
+        return min(self._timeout, remaining)
+
+    def close(self):
+        if self._http_session:
+            self._http_session.close()
+            self._http_session = None
+
+    @property
+    def _http(self):
+        # Created on first use so subclasses with another transport
+        # (AsyncTL_WPA4220) never open a requests pool
+        if self._http_session is None:
+            with self._lock:
+                if self._http_session is None:
+                    session = requests.Session()
+                    session.mount('http://', HTTPAdapter(
+                        pool_connections=1, pool_maxsize=self._pool_size))
+                    self._http_session = session
+        return self._http_session
+
     class TpError(Exception):
         def __init__(self, msg, error_code=None):
             super().__init__(msg)
             self.error_code = error_code
 
+    class DeadlineExceeded(TpError):
+        def __init__(self, msg='Deadline exceeded'):
+            super().__init__(msg, 'deadline')
+
+    class RequestTimeout(TpError):
+        # 'timeout' is taken: the device's code for a rejected session
+        def __init__(self, path):
+            super().__init__(f'No answer for {path} in time', 'timeout-request')
+
     class Op(Enum):
         LOGIN = 'login'
         READ = 'read'
@@ -57,6 +355,8 @@ class TL_WPA4220(object):
         LOAD = 'load'
         INSERT = 'insert'
 
+    CACHED_OPS = (Op.READ, Op.LOAD)  # envelopes reused within a session
+
     class LogType(Enum):
         ALL = 'ALL'
         DHCP = 'dhcp'
@@ -72,52 +372,123 @@ class TL_WPA4220(object):
         ERROR = 'ERROR'
         INFO = 'INFO'
 
-    def login(self, password):
-        if self._password_hash:
-            raise self.TpError('Already logged in!')
-
-        self._key = os.urandom(16)
-        self._iv = os.urandom(16)
-        def get_random_bytes(size):
-            return ''.join([f'{i:02x}' for i in os.urandom(int(size / 2))]).encode(
-                'utf-8')
-
-        self._key = get_random_bytes(self.KEY_LEN)
-        self._iv = get_random_bytes(AES.block_size)
-        self.logger.debug(f'Using key: {self._key}, iv: {self._iv}')
+    # Endpoints not every model has (e.g. no Wi-Fi on the TL-PA9020P), they
+    # are requested through _optional_encrypted_req and can be probed once
+    OPTIONAL_ENDPOINTS = {
+        'admin/wlan_status': Op.READ,
+        'admin/guest?form=guest_2g': Op.READ,
+        'admin/guest?form=guest_5g': Op.READ,
+        'admin/wifiMove.json': Op.READ,
+        'admin/wifiTimeEnable': Op.READ,
+        'admin/wifiTimeControl': Op.READ,
+        'admin/wireless?form=statistics': Op.LOAD,
+    }
+    # error codes of a firmware without the requested endpoint
+    MISSING_ENDPOINT_CODES = ('not supported',)
+
+    @staticmethod
+    def capability_key(firmware_info):
+        """Key of the capability map for the model/firmware of a device."""
+        if not isinstance(firmware_info, dict) or not firmware_info.get('model'):
+            return None
+        return '{}|{}'.format(firmware_info['model'],
+                              firmware_info.get('firmware_version') or '')
 
-        self._get_rsa_pubkey_seq()
+    @property
+    def unsupported_endpoints(self):
+        return frozenset(self._unsupported)
 
-        m = hashlib.md5()
-        m.update(password.encode('utf-8'))
-        self._password_hash = m.hexdigest()
+    def set_unsupported_endpoints(self, paths):
+        self._unsupported = set(paths)
 
-        encrypted_pw = self._rsa_encrypt(password)
-        for _i in range(2):
+    def probe_capabilities(self):
+        """Request every optional endpoint once, returns the unsupported ones."""
+        self._require_login()
+        unsupported = set()
+        for path, operation in self.OPTIONAL_ENDPOINTS.items():
             try:
-                self._encrypted_req("login?form=login", self.Op.LOGIN, {
-                    'password': encrypted_pw,
-                })
-                break
-            except TL_WPA4220.TpError as e:
-                if e.error_code != 'decode-error':
-                    self._unset_login_data()
+                self._encrypted_req(path, operation)
+            except (TL_WPA4220.TpError, requests.exceptions.HTTPError) as e:
+                if not self._endpoint_missing(e):
                     raise e
-                self.logger.debug(f'Got error {e.error_code}, retrying...')
-                time.sleep(0.5)
+                unsupported.add(path)
+        self._unsupported = unsupported
+        return sorted(unsupported)
+
+    def _endpoint_missing(self, error):
+        # Only an explicit "no such endpoint" counts, the result is stored
+        # per model/firmware; anything else (session gone, deadline, a
+        # one-off error) fails the probe and it is repeated later
+        if isinstance(error, TL_WPA4220.TpError):
+            return error.error_code in self.MISSING_ENDPOINT_CODES
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code == 404
+
+    def login(self, password):
+        start = time.perf_counter()
+        ok = False
+        try:
+            self._new_session_keys()
+            self._get_rsa_pubkey_seq()
+            login_data = self._login_data(password)
+
+            for _i in range(2):
+                try:
+                    self._encrypted_req("login?form=login", self.Op.LOGIN, login_data)
+                    break
+                except TL_WPA4220.TpError as e:
+                    if e.error_code != 'decode-error':
+                        self._unset_login_data()
+                        raise e
+                    self.logger.debug('Got error %s, retrying...', e.error_code)
+                    time.sleep(0.5)
+            ok = True
+        finally:
+            self.stats.request('login', time.perf_counter() - start, ok)
 
     def logged_in(self):
         return self._password_hash != None
 
+    def ping(self):
+        """Unauthenticated liveness check, returns the round trip in seconds.
+
+        Reads the RSA key from login?form=auth like the web UI's login page
+        without storing it, so it does not disturb a logged-in session.
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            r = self._post("http://{}/login?form=auth".format(self.ip),
+                data={"operation": "read"}, timeout=self._request_timeout())
+            r.raise_for_status()
+            self._check_ping_response(r.json())
+            ok = True
+            return time.perf_counter() - start
+        finally:
+            self.stats.request('ping', time.perf_counter() - start, ok)
+
+    def _check_ping_response(self, r):
+        if not r.get("success"):
+            raise self.TpError("Liveness probe failed", r.get("errorcode"))
+
+    def forget_session(self):
+        """Drop the login state without a request (the device dropped it)."""
+        self._unset_login_data()
+
     def logout(self):
         self._require_login()
         old_timeout = self._timeout
         self._timeout = 2.0 # Do not block in this case...
-        self._encrypted_req('admin/logout.htm', self.Op.WRITE, extra_headers={
-            'Cookie': 'Authorization=;path=/'
-        })
-        self._timeout = old_timeout
-        self._unset_login_data()
+        try:
+            self._encrypted_req('admin/logout.htm', self.Op.WRITE, extra_headers={
+                'Cookie': 'Authorization=;path=/'
+            })
+        except TL_WPA4220.RequestTimeout as e:
+            self.logger.debug('%s', e)
+        finally:
+            # The session is gone for us even if the device did not answer
+            self._timeout = old_timeout
+            self._unset_login_data()
 
     def reboot(self):
         self._require_login()
@@ -126,6 +497,50 @@ class TL_WPA4220(object):
         self._unset_login_data()
         return ret
 
+    def fetch(self, endpoints, parallel=DEFAULT_PARALLEL, optional=()):
+        """Call several getters at once, returns a FetchBundle.
+
+        ``endpoints`` are getter names ('get_wlan_status', ...) or a dict
+        {name: getter}.  Up to ``parallel`` of them run at the same time on
+        the connection pool of this client.  Timed out requests and errors
+        of the names in ``optional`` are kept in the bundle, any other
+        error is raised once all requests finished.
+        """
+        calls = self._fetch_calls(endpoints)
+        start = time.perf_counter()
+        workers = max(1, min(parallel, self._pool_size, len(calls)))
+        if workers == 1:
+            results = [self._fetch_one(name, getter) for name, getter in calls]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda call: self._fetch_one(*call), calls))
+        return self._fetch_done(results, optional, time.perf_counter() - start)
+
+    def _fetch_calls(self, endpoints):
+        self._require_login()
+        if isinstance(endpoints, dict):
+            calls = list(endpoints.items())
+        else:
+            calls = [(getter, getter) for getter in endpoints]
+        for _name, getter in calls:
+            if not getter.startswith('get_') or not callable(getattr(self, getter, None)):
+                raise self.TpError(f'Invalid endpoint: {getter}')
+        return calls
+
+    def _fetch_one(self, name, getter):
+        start = time.perf_counter()
+        try:
+            value = getattr(self, getter)()
+        except Exception as e:
+            return FetchResult(name, error=e, seconds=time.perf_counter() - start)
+        return FetchResult(name, value, seconds=time.perf_counter() - start)
+
+    def _fetch_done(self, results, optional, seconds):
+        for result in results:
+            if not result.ok and not result.timed_out and result.name not in optional:
+                raise result.error
+        return FetchBundle(results, seconds)
+
     def get_firmware_info(self):
         self._require_login()
         return self._encrypted_req('admin/firmware?form=upgrade', self.Op.READ)
@@ -334,14 +749,40 @@ class TL_WPA4220(object):
         endpoints used by the TL-WPA4220 range.  Instead of raising an
         exception when an endpoint is missing, gracefully return a default
         value so that other features (like PLC status) remain usable.
+        Endpoints known to be unsupported (see probe_capabilities) are not
+        requested at all.
         """
+        if path in self._unsupported:
+            return default
         try:
             return self._encrypted_req(path, operation)
+        except (TL_WPA4220.RequestTimeout, TL_WPA4220.DeadlineExceeded):
+            # no answer is not a missing endpoint, the caller has to know
+            raise
         except TL_WPA4220.TpError as e:
             # Log at debug level to avoid spamming logs in normal operation
-            self.logger.debug(f"Optional request failed for {path}: {e}")
+            self.logger.debug("Optional request failed for %s: %s", path, e)
             return default
 
+    def _new_session_keys(self):
+        if self._password_hash:
+            raise self.TpError('Already logged in!')
+
+        def get_random_bytes(size):
+            return ''.join([f'{i:02x}' for i in os.urandom(int(size / 2))]).encode(
+                'utf-8')
+
+        self._key = get_random_bytes(self.KEY_LEN)
+        self._iv = get_random_bytes(AES.block_size)
+        self.logger.debug('Using key: %s, iv: %s', self._key, self._iv)
+
+    def _login_data(self, password):
+        m = hashlib.md5()
+        m.update(password.encode('utf-8'))
+        self._password_hash = m.hexdigest()
+
+        return {'password': self._rsa_encrypt(password)}
+
     def _unset_login_data(self):
         self._iv = None
         self._key = None
@@ -349,17 +790,41 @@ class TL_WPA4220(object):
         self._seq = None
         self._e = None
         self._n = None
+        self._rsa_cache.clear()
+        self._envelope_cache.clear()
 
     def _rsa_encrypt(self, plaintext):
-        encrypted = ''
-        for i in range(len(plaintext) // 64 + 1):
-            block = plaintext[i * 64:(i + 1) * 64]
-            encoded = [format(ord(c), 'x') for c in block] + ['00'] * (64 - len(block))
-            encoded = int("".join(encoded), 16)
-            encrypted_block = pow(encoded, self._e, self._n)
-            encrypted += format(encrypted_block, 'x')
+        # Same output as the per-character hex encoding of tpEncrypt.js:
+        # 64 char blocks, zero filled, no padding of the encrypted blocks.
+        # Results are kept per session key, the sign of most requests only
+        # differs by the data length.
+        encrypted = self._rsa_cache.get(plaintext)
+        if encrypted is not None:
+            return encrypted
+
+        e, n = self._e, self._n
+        size = self.RSA_BLOCK_LEN
+        out = []
+        for i in range(0, len(plaintext) + 1, size):
+            block = plaintext[i:i + size]
+            try:
+                raw = block.encode('latin-1')
+            except UnicodeEncodeError:
+                raw = None
+            if raw is not None and (not raw or min(raw) >= 0x10):
+                encoded = int.from_bytes(raw + bytes(size - len(raw)), 'big')
+            else:
+                # chars not hex encoded to exactly two digits
+                encoded = [format(ord(c), 'x') for c in block] + ['00'] * (size - len(block))
+                encoded = int("".join(encoded), 16)
+            out.append(format(pow(encoded, e, n), 'x'))
+        encrypted = ''.join(out)
         if len(encrypted) % 2 == 1:
             encrypted = '0' + encrypted
+
+        if len(self._rsa_cache) >= self.RSA_CACHE_SIZE:
+            self._rsa_cache.clear()
+        self._rsa_cache[plaintext] = encrypted
         return encrypted
 
     def _pad(self, plaintext):
@@ -378,25 +843,100 @@ class TL_WPA4220(object):
         return plaintext[:-ord(plaintext[len(plaintext) - 1:])].decode('utf-8')
 
     def _get_rsa_pubkey_seq(self):
-        r = requests.post("http://{}/login?form=auth".format(self.ip),
-            data={"operation": "read"})
-        r = r.json()
+        start = time.perf_counter()
+        ok = False
+        try:
+            r = self._post("http://{}/login?form=auth".format(self.ip),
+                data={"operation": "read"}, timeout=self._request_timeout())
+            self._set_rsa_pubkey_seq(r.json())
+            ok = True
+        finally:
+            self.stats.request('login?form=auth', time.perf_counter() - start, ok)
+
+    def _set_rsa_pubkey_seq(self, r):
         if not r.get("success"):
-            raise TpError("Something went wrong, couldn't retrieve RSA public key",
+            raise self.TpError("Something went wrong, couldn't retrieve RSA public key",
                 r.get("errorcode"))
 
         self._n = int(r["data"]["key"][0], 16)
         self._e = int(r["data"]["key"][1], 16)
         self._seq = int(r["data"]["seq"])
+        self._rsa_cache.clear()
+        self._envelope_cache.clear()
 
-        self.logger.debug(f'n: {self._n}, e: {self._e}, seq: {self._seq}')
+        self.logger.debug('n: %s, e: %s, seq: %s', self._n, self._e, self._seq)
+
+    def _post(self, uri, headers=None, **kwargs):
+        if not self._keep_alive:
+            return self._post_once(uri, headers, **kwargs)
+        try:
+            return self._http.post(uri, headers=headers, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            # Only a connection the device dropped mid-request counts;
+            # refused or unreachable (device rebooting) says nothing
+            # about keep-alive and must not switch it off for good
+            if not (e.args and isinstance(e.args[0], ProtocolError)):
+                raise e
+            # Reused connection was closed by the device, retry once on a
+            # fresh one and stop keeping connections alive from now on
+            with self._lock:
+                # parallel requests of fetch() may fail at the same time
+                if self._keep_alive:
+                    self.logger.debug('Keep-alive connection failed (%s), '
+                        'falling back to Connection: close', e)
+                    self._keep_alive = False
+                    self._http.close()
+            return self._post_once(uri, headers, **kwargs)
+
+    def _post_once(self, uri, headers=None, **kwargs):
+        # One TCP connection per request like the web UI, outside the pool:
+        # requests.post() closes its connection afterwards, so a socket the
+        # device closed is never picked up again
+        headers = dict(headers or {})
+        headers['Connection'] = 'close'
+        return requests.post(uri, headers=headers, **kwargs)
 
     def _encrypted_req(self, path, operation, data={}, extra_headers={}):
+        start = time.perf_counter()
+        ok = False
+        try:
+            uri, data, headers = self._build_request(path, operation, data, extra_headers)
+
+            sent = time.perf_counter()
+            try:
+                r = self._post(uri, data=data, headers=headers,
+                               timeout=self._request_timeout())
+            except requests.exceptions.ReadTimeout:
+                raise TL_WPA4220.RequestTimeout(path)
+            self.stats.add(path, 'roundtrip', time.perf_counter() - sent)
+
+            r.raise_for_status()
+            result = self._parse_response(r.text, path)
+            ok = True
+            return result
+        finally:
+            self.stats.request(path, time.perf_counter() - start, ok)
+
+    def _build_request(self, path, operation, data={}, extra_headers={}):
         uri = "http://{}/{}".format(self.ip, path)
         data = dict(data)
         data['operation'] = operation.value
         encoded_data = urlencode(data)
+        start = time.perf_counter()
+
+        # With fixed key/iv/seq the envelope of a request only depends on
+        # path, operation and payload: reuse it for the rest of the session.
+        # Only for reads, writes are rare and each one is built afresh
+        cacheable = operation in self.CACHED_OPS
+        cache_key = (path, operation, encoded_data, tuple(sorted(extra_headers.items())))
+        cached = self._envelope_cache.get(cache_key) if cacheable else None
+        if cached is not None:
+            uri, data, headers = cached
+            self.logger.debug('uri %s (cached envelope)', uri)
+            return uri, dict(data), dict(headers)
+
         encrypted_data = self._aes_encrypt(encoded_data) if encoded_data else None
+        encrypted = time.perf_counter()
 
         sign_dict = {
             'h': self._password_hash,
@@ -409,14 +949,18 @@ class TL_WPA4220(object):
                 'i': self._iv.decode('utf-8'),
             })
 
-        self.logger.debug(f'uri {uri}')
-        self.logger.debug(f'data {encoded_data}')
-        self.logger.debug(f'sign: {urlencode(sign_dict)}')
+        sign = urlencode(sign_dict)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('uri %s', uri)
+            self.logger.debug('data %s', encoded_data)
+            self.logger.debug('sign: %s', sign)
 
         data = {
-            'sign': self._rsa_encrypt(urlencode(sign_dict)),
+            'sign': self._rsa_encrypt(sign),
             'data': encrypted_data
         }
+        self.stats.add(path, 'encrypt', encrypted - start)
+        self.stats.add(path, 'sign', time.perf_counter() - encrypted)
 
         headers = {
             "Host": self.ip,
@@ -426,56 +970,457 @@ class TL_WPA4220(object):
             "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
             "X-Requested-With": "XMLHttpRequest",
             "Origin": "http://{}".format(self.ip),
-            "Connection": "close",
             "Referer": "http://{}/".format(self.ip),
             "Cookie": "Authorization="
         }
         headers.update(extra_headers)
 
-        try:
-            r = requests.post(uri, data=data, headers=headers, timeout=self._timeout)
-        except requests.exceptions.ReadTimeout:
-            return None
-
-        r.raise_for_status()
+        if cacheable:
+            if len(self._envelope_cache) >= self.ENVELOPE_CACHE_SIZE:
+                self._envelope_cache.clear()
+            self._envelope_cache[cache_key] = (uri, dict(data), dict(headers))
+        return uri, data, headers
 
+    def _parse_response(self, body, path=None):
         try:
-            encrypted_data = r.json().get("data")
+            start = time.perf_counter()
+            encrypted_data = json.loads(body).get("data")
             response = self._aes_decrypt(encrypted_data)
-            self.logger.debug(f'response: {response}')
+            decrypted = time.perf_counter()
+            self.logger.debug('response: %s', response)
             parsed_response = json.loads(response)
+            self.stats.add(path, 'decrypt', decrypted - start)
+            self.stats.add(path, 'parse', time.perf_counter() - decrypted)
             if parsed_response.get("success"):
                 return parsed_response.get("data")
 
             error_code = parsed_response.get("errorcode")
-        except JSONDecodeError as e:
+        except json.JSONDecodeError as e:
             raise TL_WPA4220.TpError(f'Failed to decode: {e}', 'decode-error')
         except Exception as e:
-            print("There was some error, could not decrypt response. Error: {}".format(e))
+            self.logger.error('There was some error, could not decrypt response. Error: %s', e)
             raise e
 
         raise TL_WPA4220.TpError(
             f'Failed to execute command, error code: {error_code}', error_code)
 
 
+def install_cli_logging(level=logging.WARNING):
+    """Console output for the command line tool, installed only once."""
+    logger = logging.getLogger(TL_WPA4220.__name__)
+    if not any(getattr(h, '_tl_wpa4220_cli', False) for h in logger.handlers):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(
+            '[%(levelname)s] %(name)s: %(funcName)s: %(message)s'))
+        console_handler._tl_wpa4220_cli = True
+        logger.addHandler(console_handler)
+    logger.setLevel(level)
+    return logger
+
+
+_capabilities_lock = threading.Lock()
+
+
+def apply_cached_capabilities(device, firmware_info, path):
+    """Load the unsupported endpoints of the model from path (probe if unknown)."""
+    key = TL_WPA4220.capability_key(firmware_info)
+    if key is None:
+        return
+    # several targets of one run share the file
+    with _capabilities_lock:
+        _apply_cached_capabilities(device, key, path)
+
+
+def _apply_cached_capabilities(device, key, path):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache:
+        device.set_unsupported_endpoints(cache[key])
+        return
+    cache[key] = device.probe_capabilities()
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        device.logger.warning('Could not save capabilities to %s: %s', path, e)
+
+
+# show action: label and getter, printed in this order after FirmwareInfo
+SHOW_ENDPOINTS = (
+    ('Region', 'get_region'),
+    ('Locale', 'get_locale'),
+    ('Locales', 'get_locales'),
+    ('Profile', 'get_profile'),
+    ('LanSettings', 'get_lan_settings'),
+    ('DhcpSettings', 'get_dhcp_settings'),
+    ('WlanStatus', 'get_wlan_status'),
+    ('WifiMoveStatus', 'get_wifi_move_status'),
+    ('WifiTimeControl', 'get_wifi_time_control_enabled'),
+    ('WifiTimeControlStatus', 'get_wifi_time_control_status'),
+    ('WifiClients', 'get_wifi_clients'),
+    ('GuestWlan_2gStatus', 'get_guest_wlan_2g_status'),
+    ('GuestWlan_5gStatus', 'get_guest_wlan_5g_status'),
+    ('PlcDeviceStatus', 'get_plc_device_status'),
+    ('PlcLocalSettings', 'get_plc_local_settings'),
+    ('MacFilterList', 'get_mac_filters_list'),
+    ('LedStatus', 'get_led_status'),
+    ('SystemLog', 'get_system_log'),
+    ('SystemLogFilters', 'get_system_log_filters'),
+)
+
+
+def show(device, workers=TL_WPA4220.DEFAULT_PARALLEL, capabilities=None):
+    """Everything the show action prints, returns (results, seconds).
+
+    FirmwareInfo comes first (it decides which endpoints the model has),
+    the other reads run ``workers`` at a time; a failing one does not stop
+    the others.
+    """
+    start = time.perf_counter()
+    device.set_system_log_filters(TL_WPA4220.LogType.ALL, TL_WPA4220.LogLevel.ALL)
+    first = device.fetch({'FirmwareInfo': 'get_firmware_info'})
+    if capabilities:
+        apply_cached_capabilities(device, first.value('FirmwareInfo'), capabilities)
+    endpoints = dict(SHOW_ENDPOINTS)
+    rest = device.fetch(endpoints, parallel=workers, optional=endpoints)
+    return list(first) + list(rest), time.perf_counter() - start
+
+
+def format_timings(results, seconds, workers):
+    lines = ['Timings (total {:.0f} ms, {} workers):'.format(seconds * 1000, workers)]
+    for result in sorted(results, key=lambda r: r.seconds, reverse=True):
+        lines.append('  {:<24}{:>9.1f} ms{}'.format(
+            result.name, result.seconds * 1000, '' if result.ok else '  (failed)'))
+    return '\n'.join(lines)
+
+
+# actions that can run against many targets at once (read only)
+MULTI_ACTIONS = ('show', 'led-status', 'plc-info')
+
+
+def expand_targets(spec):
+    """Targets from 'ip', 'ip1,ip2', a CIDR range '192.168.0.0/28' or '@file'.
+
+    A file lists one target (or range) per line, '#' starts a comment.
+    """
+    targets = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if part.startswith('@'):
+            with open(part[1:]) as f:
+                for line in f:
+                    line = line.split('#', 1)[0].strip()
+                    if line:
+                        targets.extend(expand_targets(line))
+        elif '/' in part:
+            network = ipaddress.ip_network(part, strict=False)
+            hosts = list(network.hosts()) or [network.network_address]
+            targets.extend(str(host) for host in hosts)
+        else:
+            targets.append(part)
+    return list(dict.fromkeys(targets))
+
+
+def describe_request_error(e):
+    """urllib3's reason without the connection object's repr, so equal
+    errors of different requests compare equal"""
+    reason = str(getattr(e.args[0], 'reason', None) or e) if e.args else str(e)
+    if reason.startswith('<') and '>: ' in reason:
+        reason = reason.split('>: ', 1)[1]
+    return reason
+
+
+def poll_target(target, action, password, workers=TL_WPA4220.DEFAULT_PARALLEL,
+                timeout=TL_WPA4220.DEFAULT_TIMEOUT, deadline=None,
+                capabilities=None, lock_timeout=None,
+                pool_size=TL_WPA4220.DEFAULT_POOL_SIZE, keep_alive=True):
+    """Run a read action on one device and return its record, never raises.
+
+    The record has target, ok, ms and either data (plus errors of single
+    reads for show) or error/error_code.  Without lock_timeout the lock
+    file is not used.
+    """
+    start = time.perf_counter()
+    record = {'target': target, 'ok': False}
+    lock = DeviceLock(target)
+    device = TL_WPA4220(target, pool_size=max(pool_size, workers),
+                        keep_alive=keep_alive, timeout=timeout)
+    if deadline:
+        device.set_deadline(time.monotonic() + deadline)
+    try:
+        if lock_timeout is not None and not lock.acquire(timeout=lock_timeout):
+            raise TL_WPA4220.TpError(
+                'in use by process {}'.format(lock.holder()), 'locked')
+        try:
+            device.login(password)
+        except TL_WPA4220.TpError as e:
+            if e.error_code != 'timeout':
+                raise e
+            raise TL_WPA4220.TpError(
+                'Login failed, password invalid or another device is logged in', 'timeout')
+        try:
+            if action == 'show':
+                results, _seconds = show(device, workers, capabilities)
+                record['data'] = {r.name: r.value for r in results if r.ok}
+                record['errors'] = {r.name: str(r.error) for r in results if not r.ok}
+                record['ok'] = not record['errors']
+            elif action == 'led-status':
+                record['data'] = device.get_led_status()
+                record['ok'] = True
+            elif action == 'plc-info':
+                record['data'] = device.get_plc_device_status()
+                record['ok'] = True
+            else:
+                raise TL_WPA4220.TpError(f'Unknown action {action}')
+        finally:
+            if device.logged_in():
+                device.set_deadline(None)
+                device.logout()
+    except (requests.exceptions.Timeout, TL_WPA4220.RequestTimeout):
+        record['error'] = 'no answer within {:g}s'.format(timeout)
+        record['error_code'] = 'timeout'
+    except requests.exceptions.RequestException as e:
+        record['error'] = describe_request_error(e)
+        record['error_code'] = 'connection'
+    except TL_WPA4220.TpError as e:
+        record['error'] = str(e)
+        record['error_code'] = e.error_code
+    finally:
+        device.close()
+        lock.release()
+    record['ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def poll_targets(targets, action, password, parallel=8, **kwargs):
+    """poll_target() for many devices, ``parallel`` at a time.
+
+    Yields the records in the order the devices finish.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(targets)))) as pool:
+        futures = [pool.submit(poll_target, target, action, password, **kwargs)
+                   for target in targets]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def format_report(records, seconds, parallel):
+    """Aggregate of poll_targets(): successes, latency, most frequent errors."""
+    stats = RequestStats(window=max(1, len(records)))
+    errors = {}
+    for record in records:
+        if record['ok']:
+            stats.add('device', 'total', record['ms'] / 1000)
+        elif record.get('error'):
+            errors[record['error']] = errors.get(record['error'], 0) + 1
+    ok = sum(1 for record in records if record['ok'])
+    lines = ['{}/{} ok, {} failed in {:.1f}s ({} parallel)'.format(
+        ok, len(records), len(records) - ok, seconds, parallel)]
+    if ok:
+        lines.append('latency p50 {:.0f} ms, p95 {:.0f} ms, max {:.0f} ms'.format(
+            stats.percentile('device', 50) * 1000, stats.percentile('device', 95) * 1000,
+            stats.percentile('device', 100) * 1000))
+    for error, count in sorted(errors.items(), key=lambda item: -item[1])[:5]:
+        lines.append('{:>4}x {}'.format(count, error))
+    return '\n'.join(lines)
+
+
+# watch action: name on the command line -> getter
+WATCH_ENDPOINTS = {
+    'plc': 'get_plc_device_status',
+    'clients': 'get_wifi_clients',
+    'wlan': 'get_wlan_status',
+    'led': 'get_led_status',
+    'firmware': 'get_firmware_info',
+}
+
+
+def _keyed(value):
+    # lists of clients/PLC peers by MAC, so a delta names single entries
+    if isinstance(value, list) and value and all(
+            isinstance(v, dict) and (v.get('mac') or v.get('device_mac')) for v in value):
+        return {v.get('mac') or v.get('device_mac'): v for v in value}
+    return value
+
+
+def merge_patch(old, new):
+    """JSON merge patch (RFC 7386) turning the dict old into new ({} if equal)."""
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            if isinstance(old[key], dict) and isinstance(value, dict):
+                patch[key] = merge_patch(old[key], value)
+            else:
+                patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def watch(device, password, endpoints, interval, count=0, lock=None, out=None):
+    """Poll endpoints every interval seconds on one session, write NDJSON.
+
+    The first line holds the full snapshot ('full': true), the following
+    ones only what changed as JSON merge patch ('changed'); lists of
+    clients and PLC peers are keyed by MAC.  Polls without changes print
+    nothing.  A rejected session is logged in again on the next poll.
+    When another process waits for the lock file the session is given up
+    between two polls.  Runs until Ctrl-C or ``count`` polls.
+    """
+    out = out or sys.stdout
+    names = {name: WATCH_ENDPOINTS[name] for name in endpoints}
+    state = None
+    polls = 0
+    next_at = time.monotonic()
+    try:
+        while not count or polls < count:
+            polls += 1
+            if lock is not None and not lock.locked:
+                lock.acquire()
+            record = {'ts': round(time.time(), 3), 'target': device.ip}
+            try:
+                if not device.logged_in():
+                    device.login(password)
+                bundle = device.fetch(names)
+            except TL_WPA4220.DeadlineExceeded:
+                raise
+            except (TL_WPA4220.TpError, requests.exceptions.RequestException) as e:
+                device.forget_session()
+                record['error'] = str(e)
+            else:
+                snapshot = {
+                    # timed out: unchanged
+                    r.name: (state or {}).get(r.name) if r.timed_out else _keyed(r.value)
+                    for r in bundle
+                }
+                if state is None:
+                    record['full'] = True
+                    record['data'] = snapshot
+                else:
+                    record['changed'] = merge_patch(state, snapshot)
+                    if not record['changed']:
+                        record = None
+                state = snapshot
+            if record is not None:
+                print(json.dumps(record, default=str, separators=(',', ':')),
+                      file=out, flush=True)
+
+            if lock is not None and lock.contended():
+                if device.logged_in():
+                    device.logout()
+                lock.release()
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                # too slow for the interval: skip the missed polls
+                next_at = time.monotonic()
+            elif not count or polls < count:
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Tools to manage the TL-WPA4220')
-    parser.add_argument('target', type=str, metavar='target', help='IP of the TL-WPA4220 device')
+    parser.add_argument('target', type=str, metavar='target',
+                        help='IP of the TL-WPA4220 device; several as ip1,ip2, a CIDR '
+                             'range (192.168.1.0/24) or @file (one per line)')
     parser.add_argument('action', type=str, metavar='action',
         default='show', nargs="?",
-        help='Action to perform: [show | led-status | led-off | led-on | reboot]')
+        help='Action to perform: [show | led-status | led-off | led-on | reboot | watch]')
     parser.add_argument('-p', '--password', type=str, metavar='password',
                         help='Password of the TL-WPA4220 Web interface (default: admin)', default='admin')
     parser.add_argument('-d', '--debug', action='store_true', default=False)
+    parser.add_argument('--pool-size', type=int, default=TL_WPA4220.DEFAULT_POOL_SIZE,
+                        help='Number of kept-alive HTTP connections to the device')
+    parser.add_argument('--no-keep-alive', action='store_true', default=False,
+                        help='Open a new connection per request (for misbehaving firmwares)')
+    parser.add_argument('--timeout', type=float, default=TL_WPA4220.DEFAULT_TIMEOUT,
+                        help='Timeout of a single request in seconds')
+    parser.add_argument('--deadline', type=float, default=None, metavar='seconds',
+                        help='Budget for the whole run (login, reads, logout)')
+    parser.add_argument('--capabilities', type=str, metavar='file',
+                        default=os.path.expanduser('~/.cache/tl_wpa4220/capabilities.json'),
+                        help='Cache of unsupported endpoints per model/firmware')
+    parser.add_argument('--lock-timeout', type=float, default=60.0, metavar='seconds',
+                        help='How long to wait for another session on this host to end')
+    parser.add_argument('--no-lock', action='store_true', default=False,
+                        help='Do not wait for other sessions on this host (lock file)')
+    parser.add_argument('--workers', type=int, default=TL_WPA4220.DEFAULT_PARALLEL,
+                        help='Reads of the show action running at the same time')
+    parser.add_argument('--parallel', type=int, default=8,
+                        help='Devices polled at the same time (several targets)')
+    parser.add_argument('--interval', type=float, default=10.0, metavar='seconds',
+                        help='watch: time between two polls')
+    parser.add_argument('--endpoints', type=str, default='plc,clients,wlan',
+                        help='watch: comma separated, any of ' + ','.join(WATCH_ENDPOINTS))
+    parser.add_argument('--count', type=int, default=0,
+                        help='watch: stop after this many polls (0: until Ctrl-C)')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--json', action='store_true', default=False,
+                        help='show: one JSON document (values, errors, timings)')
+    output.add_argument('--ndjson', action='store_true', default=False,
+                        help='show: one JSON line per endpoint')
+    parser.add_argument('--timings', action='store_true', default=False,
+                        help='show: print the duration of every read to stderr')
     args = parser.parse_args()
-    device = TL_WPA4220(args.target)
+    watch_endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    if args.action == 'watch' and (
+            not watch_endpoints or not set(watch_endpoints) <= set(WATCH_ENDPOINTS)):
+        parser.error(f'--endpoints takes {",".join(WATCH_ENDPOINTS)}')
+
+    targets = expand_targets(args.target)
+    if not targets:
+        parser.error('no target')
+    if len(targets) > 1:
+        # one JSON record per device as it finishes, the report on stderr
+        if args.action not in MULTI_ACTIONS:
+            parser.error(f'{args.action} needs a single target, several are '
+                         f'only possible for {", ".join(MULTI_ACTIONS)}')
+        install_cli_logging(logging.DEBUG if args.debug else logging.ERROR)
+        start = time.perf_counter()
+        records = []
+        for record in poll_targets(
+                targets, args.action, args.password, parallel=args.parallel,
+                workers=args.workers, timeout=args.timeout, deadline=args.deadline,
+                capabilities=args.capabilities,
+                lock_timeout=None if args.no_lock else args.lock_timeout,
+                pool_size=args.pool_size, keep_alive=not args.no_keep_alive):
+            print(json.dumps(record, default=str), flush=True)
+            records.append(record)
+        print(format_report(records, time.perf_counter() - start, args.parallel),
+              file=sys.stderr)
+        sys.exit(0 if all(record['ok'] for record in records) else 1)
+    args.target = targets[0]
+
+    # held until the process exits, other runs and Home Assistant wait for it
+    lock = DeviceLock(args.target)
+    if not args.no_lock and not lock.acquire(timeout=args.lock_timeout):
+        print(f"[!] {args.target} is in use by process {lock.holder()}, "
+              f"gave up after {args.lock_timeout:g}s")
+        sys.exit(1)
+    device = TL_WPA4220(args.target, pool_size=max(args.pool_size, args.workers),
+                        keep_alive=not args.no_keep_alive, timeout=args.timeout)
+    if args.deadline:
+        device.set_deadline(time.monotonic() + args.deadline)
 
-    if args.debug:
-        device.logger.setLevel(logging.DEBUG)
+    install_cli_logging(logging.DEBUG if args.debug else logging.WARNING)
 
     try:
         device.login(args.password)
         #print("[+] Login executed successfully")
+    except (requests.exceptions.Timeout, TL_WPA4220.RequestTimeout):
+        print(f"[!] Login failed, no answer within {args.timeout}s")
+        sys.exit(1)
     except TL_WPA4220.TpError as e:
         if (e.error_code == 'timeout'):
             # We could get the reason by the first value of JS httpAutErrorArray
@@ -484,54 +1429,75 @@ if __name__ == '__main__':
             print(f"[!] Login failed: {e}")
         sys.exit(1)
 
-    exit_status = True
-    if args.action == 'show':
-        device.set_system_log_filters(
-            TL_WPA4220.LogType.ALL, TL_WPA4220.LogLevel.ALL)
-
-        print('FirmwareInfo:', device.get_firmware_info())
-        print('Region:', device.get_region())
-        print('Locale:', device.get_locale())
-        print('Locales:', device.get_locales())
-        print('Profile:', device.get_profile())
-        print('LanSettings', device.get_lan_settings())
-        print('DhcpSettings', device.get_dhcp_settings())
-        #print('DhcpClients', device.get_dhcp_clients())
-        print('WlanStatus:', device.get_wlan_status())
-        print('WifiMoveStatus:', device.get_wifi_move_status())
-        print('WifiTimeControl:', device.get_wifi_time_control_enabled())
-        print('WifiTimeControlStatus:', device.get_wifi_time_control_status())
-        print('WifiClients:', device.get_wifi_clients())
-        print('GuestWlan_2gStatus:', device.get_guest_wlan_2g_status())
-        print('GuestWlan_5gStatus:', device.get_guest_wlan_5g_status())
-        print('PlcDeviceStatus:', device.get_plc_device_status())
-        print('PlcLocalSettings:', device.get_plc_local_settings())
-        print('MacFilterList:', device.get_mac_filters_list())
-        print('LedStatus:', device.get_led_status())
-        print('SystemLog', device.get_system_log())
-        print('SystemLogFilters', device.get_system_log_filters())
-    elif args.action == 'led-status':
-        led_status = device.get_led_status()
-        print('Led status:', 'on' if led_status else 'off')
-        exit_status = led_status
-    elif args.action == 'plc-info':
-        #print('PlcLocalSettings:', json.dumps(device.get_plc_local_settings(), indent=4))
-        plc_status = device.get_plc_device_status()
-        print(json.dumps({"data" : plc_status}, indent=4))
-        exit_status = True        
-    elif args.action == 'led-on':
-        device.led_switch(True)
-        exit_status = device.get_led_status()
-    elif args.action == 'led-off':
-        device.led_switch(False)
-        exit_status = not device.get_led_status()
-    elif args.action == 'reboot':
-        sys.exit(0 if device.reboot() else 1)
-    else:
-        device.logout()
-        raise argparse.ArgumentError(None, f'Unknown action {args.action}')
-
-    device.logout()
+    try:
+        exit_status = True
+        if args.action == 'show':
+            results, seconds = show(device, args.workers, args.capabilities)
+            unsupported = sorted(device.unsupported_endpoints)
+            if args.json:
+                print(json.dumps({
+                    'target': args.target,
+                    'data': {r.name: r.value for r in results if r.ok},
+                    'errors': {r.name: str(r.error) for r in results if not r.ok},
+                    'unsupported': unsupported,
+                    'timings': {r.name: round(r.seconds * 1000, 2) for r in results},
+                    'total_ms': round(seconds * 1000, 2),
+                }, indent=2, default=str))
+            elif args.ndjson:
+                for r in results:
+                    print(json.dumps({
+                        'target': args.target,
+                        'endpoint': r.name,
+                        'ok': r.ok,
+                        'ms': round(r.seconds * 1000, 2),
+                        'value': r.value,
+                        'error': str(r.error) if not r.ok else None,
+                    }, default=str))
+            else:
+                for r in results:
+                    print(f'{r.name}:', r.value if r.ok else f'[!] {r.error}')
+                    if r.name == 'FirmwareInfo' and unsupported:
+                        print('Unsupported:', unsupported)
+            if args.timings:
+                print(format_timings(results, seconds, args.workers), file=sys.stderr)
+            exit_status = all(r.ok for r in results)
+        elif args.action == 'led-status':
+            led_status = device.get_led_status()
+            print('Led status:', 'on' if led_status else 'off')
+            exit_status = led_status
+        elif args.action == 'plc-info':
+            #print('PlcLocalSettings:', json.dumps(device.get_plc_local_settings(), indent=4))
+            plc_status = device.get_plc_device_status()
+            print(json.dumps({"data" : plc_status}, indent=4))
+            exit_status = True        
+        elif args.action == 'led-on':
+            device.led_switch(True)
+            exit_status = device.get_led_status()
+        elif args.action == 'led-off':
+            device.led_switch(False)
+            exit_status = not device.get_led_status()
+        elif args.action == 'watch':
+            watch(device, args.password, watch_endpoints, args.interval, args.count,
+                  lock=None if args.no_lock else lock)
+        elif args.action == 'reboot':
+            sys.exit(0 if device.reboot() else 1)
+        else:
+            device.logout()
+            raise argparse.ArgumentError(None, f'Unknown action {args.action}')
+
+        if device.logged_in():  # watch may have handed the session over
+            device.logout()
+        device.close()
+    except TL_WPA4220.DeadlineExceeded:
+        print(f"[!] Deadline of {args.deadline}s exceeded")
+        # free the single admin session anyway (logout waits at most 2s)
+        device.set_deadline(None)
+        try:
+            device.logout()
+        except Exception:
+            pass
+        device.close()
+        sys.exit(1)
 
     if not exit_status:
         sys.exit(1)
@@ -0,0 +1,369 @@
+# asyncio variant of TL_WPA4220 built on aiohttp
+# License: LGPL-2.1 (same as TL_WPA4220.py)
+
+import asyncio
+import time
+
+import aiohttp
+
+from .TL_WPA4220 import FetchResult, TL_WPA4220
+
+
+class AsyncTL_WPA4220(TL_WPA4220):
+    """Same API as TL_WPA4220, but every device call is a coroutine.
+
+    Requests run on the given aiohttp session (in Home Assistant the shared
+    one from ``async_get_clientsession``), so polling does not occupy
+    executor threads and a hung device can simply be cancelled.  Key
+    handling, signing and AES are inherited from TL_WPA4220.
+    """
+
+    DEFAULT_TIMEOUT = 15.0  # seconds
+
+    def __init__(self, ip, session: aiohttp.ClientSession, timeout=DEFAULT_TIMEOUT, stats=None):
+        super().__init__(ip, stats=stats)
+        self._session = session
+        self._timeout = timeout
+
+    def close(self):
+        # The aiohttp session is owned by the caller
+        pass
+
+    async def login(self, password):
+        start = time.perf_counter()
+        ok = False
+        try:
+            self._new_session_keys()
+            await self._get_rsa_pubkey_seq()
+            login_data = self._login_data(password)
+
+            for _i in range(2):
+                try:
+                    await self._encrypted_req("login?form=login", self.Op.LOGIN, login_data)
+                    break
+                except TL_WPA4220.TpError as e:
+                    if e.error_code != 'decode-error':
+                        self._unset_login_data()
+                        raise e
+                    self.logger.debug('Got error %s, retrying...', e.error_code)
+                    await asyncio.sleep(0.5)
+            ok = True
+        finally:
+            self.stats.request('login', time.perf_counter() - start, ok)
+
+    async def logout(self):
+        self._require_login()
+        old_timeout = self._timeout
+        self._timeout = 2.0 # Do not block in this case...
+        try:
+            await self._encrypted_req('admin/logout.htm', self.Op.WRITE, extra_headers={
+                'Cookie': 'Authorization=;path=/'
+            })
+        except TL_WPA4220.RequestTimeout as e:
+            self.logger.debug('%s', e)
+        finally:
+            self._timeout = old_timeout
+            self._unset_login_data()
+
+    async def ping(self):
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with self._session.post(
+                "http://{}/login?form=auth".format(self.ip),
+                data={"operation": "read"},
+                timeout=aiohttp.ClientTimeout(total=self._request_timeout()),
+            ) as r:
+                r.raise_for_status()
+                self._check_ping_response(await r.json(content_type=None))
+            ok = True
+            return time.perf_counter() - start
+        finally:
+            self.stats.request('ping', time.perf_counter() - start, ok)
+
+    async def fetch(self, endpoints, parallel=TL_WPA4220.DEFAULT_PARALLEL, optional=()):
+        calls = self._fetch_calls(endpoints)
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, parallel))
+
+        async def fetch_one(name, getter):
+            async with semaphore:
+                return await self._fetch_one(name, getter)
+
+        results = await asyncio.gather(*(fetch_one(*call) for call in calls))
+        return self._fetch_done(results, optional, time.perf_counter() - start)
+
+    async def _fetch_one(self, name, getter):
+        start = time.perf_counter()
+        try:
+            value = await getattr(self, getter)()
+        except Exception as e:
+            return FetchResult(name, error=e, seconds=time.perf_counter() - start)
+        return FetchResult(name, value, seconds=time.perf_counter() - start)
+
+    async def reboot(self):
+        self._require_login()
+        ret = (await self._encrypted_req('admin/reboot.json', self.Op.WRITE)).get(
+            'success')
+        self._unset_login_data()
+        return ret
+
+    async def get_firmware_info(self):
+        self._require_login()
+        return await self._encrypted_req('admin/firmware?form=upgrade', self.Op.READ)
+
+    async def get_region(self):
+        self._require_login()
+        return await self._encrypted_req('admin/wireless?form=region', self.Op.READ)
+
+    async def get_locales(self):
+        self._require_login()
+        return await self._encrypted_req('admin/locale?form=list', self.Op.READ)
+
+    async def get_locale(self):
+        self._require_login()
+        return await self._encrypted_req('admin/locale?form=index_lang', self.Op.READ)
+
+    async def set_locale(self, locale):
+        self._require_login()
+        return await self._encrypted_req('admin/locale?form=index_lang', self.Op.WRITE, {
+            'locale': locale,
+        })
+
+    async def get_profile(self):
+        self._require_login()
+        return await self._encrypted_req('data/profile.json', self.Op.READ)
+
+    async def set_password(self, current_password, new_password):
+        self._require_login()
+        return await self._encrypted_req('/admin/administration?form=account', self.Op.WRITE, {
+            'old_acc': 'admin',
+            'old_pwd': current_password,
+            'new_acc': 'admin',
+            'new_pwd': new_password,
+            'cfm_pwd': new_password,
+        }, extra_headers={'Cookie': 'Authorization=;path=/' })
+
+    async def get_lan_settings(self):
+        self._require_login()
+        return await self._encrypted_req('admin/lanCfg', self.Op.READ)
+
+    async def set_lan_settings(self, static=True, ip=None, mask=None, gateway=None):
+        self._require_login()
+        if static:
+            data = {}
+            if not ip or not mask or not gateway:
+                data = await self.get_lan_settings()
+            data['lan_type'] = 'static'
+            if ip:
+                data['lan_ip'] = ip
+            if mask:
+                data['lan_mask'] = mask
+            if gateway:
+                data['lan_gw'] = gateway
+        else:
+            data = {'lan_type': 'dynamic'}
+        ret = await self._encrypted_req('admin/lanCfg', self.Op.WRITE, data)
+        self._unset_login_data()
+        return ret
+
+    async def get_dhcp_settings(self):
+        self._require_login()
+        return await self._encrypted_req('admin/dhcps?form=setting', self.Op.READ)
+
+    async def set_dhcp_settings(self, enabled, ip_start, ip_end, lease_time, gateway,
+                                pri_dns='0.0.0.0', snd_dns='0.0.0.0'):
+        self._require_login()
+        if not enabled:
+            return await self._encrypted_req('admin/dhcps?form=setting', self.Op.WRITE, {
+                'enable': enabled,
+            })
+        return await self._encrypted_req('admin/dhcps?form=setting', self.Op.WRITE, {
+            'enable': enabled,
+            'ipaddr_start': ip_start,
+            'ipaddr_end': ip_end,
+            'leasetime': lease_time,
+            'gateway': gateway,
+            'pri_dns': pri_dns,
+            'snd_dns': snd_dns,
+        })
+
+    async def get_dhcp_clients(self):
+        if not self._get_enabled_value(await self.get_dhcp_settings()):
+            return []
+        return await self._encrypted_req('admin/dhcps?form=client', self.Op.READ)
+
+    async def get_wlan_status(self):
+        self._require_login()
+        return await self._optional_encrypted_req('admin/wlan_status', self.Op.READ, {})
+
+    async def get_guest_wlan_2g_status(self):
+        self._require_login()
+        return await self._optional_encrypted_req('admin/guest?form=guest_2g', self.Op.READ, {})
+
+    async def get_guest_wlan_5g_status(self):
+        self._require_login()
+        return await self._optional_encrypted_req('admin/guest?form=guest_5g', self.Op.READ, {})
+
+    async def get_wifi_move_status(self):
+        self._require_login()
+        val = await self._optional_encrypted_req('admin/wifiMove.json', self.Op.READ)
+        return self._get_enabled_value(val) if val else False
+
+    async def toggle_wifi_move(self, enabled):
+        self._require_login()
+        val = await self._encrypted_req('admin/wifiMove.json', self.Op.WRITE, {
+            'enable': int(enabled),
+        })
+        return self._get_enabled_value(val)
+
+    async def get_wifi_time_control_enabled(self):
+        self._require_login()
+        return await self._optional_encrypted_req('admin/wifiTimeEnable', self.Op.READ)
+
+    async def get_wifi_time_control_status(self):
+        self._require_login()
+        return await self._optional_encrypted_req('admin/wifiTimeControl', self.Op.READ, {})
+
+    async def get_wifi_clients(self):
+        self._require_login()
+        return await self._optional_encrypted_req('admin/wireless?form=statistics', self.Op.LOAD, {})
+
+    async def get_plc_device_status(self):
+        self._require_login()
+        return await self._encrypted_req('admin/powerline?form=plc_device', self.Op.LOAD)
+
+    async def get_plc_local_settings(self):
+        self._require_login()
+        return await self._encrypted_req('admin/powerline?form=plc_local', self.Op.READ)
+
+    async def set_plc_local_settings(self, network_name):
+        self._require_login()
+        current_settings = await self.get_plc_local_settings()
+        return await self._encrypted_req('admin/powerline?form=plc_local', self.Op.WRITE, {
+            'macaddr': current_settings['macaddr'],
+            'password': current_settings['password'],
+            'networkname': network_name,
+        })
+
+    async def get_system_log(self):
+        self._require_login()
+        try:
+            return await self._encrypted_req('admin/syslog?form=log', self.Op.LOAD)
+        except TL_WPA4220.TpError as e:
+            if e.error_code:
+                raise e
+            self.logger.warning('No log level set, impossible to get logging')
+            return []
+
+    async def get_system_log_filters(self, log_type=None):
+        if not log_type:
+            log_type = self.LogType.ALL
+        if not log_type in list(self.LogType):
+            raise self.TpError(f'Invalid log type: {log_type}')
+        self._require_login()
+        return await self._encrypted_req('admin/syslog?form=filter', self.Op.READ, {
+            'type': log_type,
+        })
+
+    async def set_system_log_filters(self, log_type, level):
+        if not log_type in list(self.LogType):
+            raise self.TpError(f'Invalid log type: {log_type}')
+        if not level in list(self.LogLevel):
+            raise self.TpError(f'Invalid log level: {level}')
+
+        self._require_login()
+        return await self._encrypted_req('admin/syslog?form=filter', self.Op.WRITE, {
+            'type': log_type.value,
+            'level': level.value,
+        })
+
+    async def _led_toggle(self, operation, data={}):
+        value = await self._encrypted_req('admin/ledSettings?form=enable', operation, data)
+        return self._get_enabled_value(value)
+
+    async def get_led_status(self):
+        self._require_login()
+        return await self._led_toggle(self.Op.READ, {
+            'enable': 'toggle',
+        })
+
+    async def led_switch(self, value):
+        self._require_login()
+        return await self._led_toggle(self.Op.WRITE, {
+            'enable': 'toggle',
+            'toggle': 'on' if value else 'off'
+        })
+
+    async def get_mac_filters_list(self):
+        self._require_login()
+        return await self._encrypted_req('admin/wireless?form=maclist', self.Op.LOAD)
+
+    async def probe_capabilities(self):
+        self._require_login()
+        unsupported = set()
+        for path, operation in self.OPTIONAL_ENDPOINTS.items():
+            try:
+                await self._encrypted_req(path, operation)
+            except (TL_WPA4220.TpError, aiohttp.ClientResponseError) as e:
+                if not self._endpoint_missing(e):
+                    raise e
+                unsupported.add(path)
+        self._unsupported = unsupported
+        return sorted(unsupported)
+
+    def _endpoint_missing(self, error):
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 404
+        return super()._endpoint_missing(error)
+
+    async def _optional_encrypted_req(self, path, operation, default=None):
+        if path in self._unsupported:
+            return default
+        try:
+            return await self._encrypted_req(path, operation)
+        except (TL_WPA4220.RequestTimeout, TL_WPA4220.DeadlineExceeded):
+            raise
+        except TL_WPA4220.TpError as e:
+            self.logger.debug("Optional request failed for %s: %s", path, e)
+            return default
+
+    async def _get_rsa_pubkey_seq(self):
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with self._session.post(
+                "http://{}/login?form=auth".format(self.ip),
+                data={"operation": "read"},
+                timeout=aiohttp.ClientTimeout(total=self._request_timeout()),
+            ) as r:
+                self._set_rsa_pubkey_seq(await r.json(content_type=None))
+            ok = True
+        finally:
+            self.stats.request('login?form=auth', time.perf_counter() - start, ok)
+
+    async def _encrypted_req(self, path, operation, data={}, extra_headers={}):
+        start = time.perf_counter()
+        ok = False
+        try:
+            uri, data, headers = self._build_request(path, operation, data, extra_headers)
+
+            sent = time.perf_counter()
+            try:
+                async with self._session.post(
+                    uri,
+                    data=data,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=self._request_timeout()),
+                ) as r:
+                    r.raise_for_status()
+                    body = await r.text()
+            except asyncio.TimeoutError:
+                raise TL_WPA4220.RequestTimeout(path)
+            self.stats.add(path, 'roundtrip', time.perf_counter() - sent)
+
+            result = self._parse_response(body, path)
+            ok = True
+            return result
+        finally:
+            self.stats.request(path, time.perf_counter() - start, ok)
@@ -0,0 +1,537 @@
+#!/bin/env python3
+
+# Caching proxy in front of TL-WPA4220/TL-WPA8630P adapters
+# License: LGPL-2.1 (same as TL_WPA4220.py)
+#
+# The devices accept a single admin session and answer slowly, so one
+# process owns the sessions, polls every device on a schedule and serves
+# the latest snapshots from memory to any number of readers:
+#
+#   python3 TL_WPA4220_proxy.py -p admin 192.168.1.10,192.168.1.11 --interval 30
+#   curl http://127.0.0.1:8470/devices
+#   curl http://127.0.0.1:8470/devices/192.168.1.10
+#   curl http://127.0.0.1:8470/devices/192.168.1.10/plc
+#   curl http://127.0.0.1:8470/metrics
+#
+# Every response carries an ETag; a request with a matching If-None-Match
+# gets a bodyless 304.  /metrics is the same data as OpenMetrics for
+# Prometheus, rendered after each poll and not per scrape.
+
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+from TL_WPA4220 import (
+    WATCH_ENDPOINTS,
+    DeviceLock,
+    TL_WPA4220,
+    describe_request_error,
+    expand_targets,
+    install_cli_logging,
+)
+
+DEFAULT_PORT = 8470
+DEFAULT_ENDPOINTS = ('firmware', 'plc', 'clients', 'wlan')
+
+OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+POLL_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOGIN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# always reported, so a band without clients shows 0 instead of vanishing
+WIFI_BANDS = ('2.4GHz', '5GHz')
+
+# name, type and help of every metric family, in the order of the scrape
+METRIC_FAMILIES = (
+    ('tplink_wpa_up', 'gauge', 'Whether the last poll of the device succeeded'),
+    ('tplink_wpa_polls', 'counter', 'Polls since the proxy started'),
+    ('tplink_wpa_poll_failures', 'counter', 'Failed polls since the proxy started'),
+    ('tplink_wpa_last_poll_timestamp_seconds', 'gauge', 'End of the last poll'),
+    ('tplink_wpa_poll_duration_seconds', 'histogram', 'Duration of a whole poll'),
+    ('tplink_wpa_login_duration_seconds', 'histogram', 'Duration of a login'),
+    ('tplink_wpa_plc_rx_rate_bits_per_second', 'gauge', 'PLC receive rate from a peer adapter'),
+    ('tplink_wpa_plc_tx_rate_bits_per_second', 'gauge', 'PLC transmit rate to a peer adapter'),
+    ('tplink_wpa_wifi_clients', 'gauge', 'Connected Wi-Fi clients per band'),
+    ('tplink_wpa_wifi_client_rx_packets', 'counter', 'Packets received from a Wi-Fi client'),
+    ('tplink_wpa_wifi_client_tx_packets', 'counter', 'Packets sent to a Wi-Fi client'),
+)
+_METRIC_HEADERS = {
+    name: '# TYPE {0} {1}\n# HELP {0} {2}\n'.format(name, kind, text).encode('utf-8')
+    for name, kind, text in METRIC_FAMILIES
+}
+
+logger = logging.getLogger('TL_WPA4220_proxy')
+
+
+def _etag(body):
+    return '"{}"'.format(hashlib.blake2b(body, digest_size=8).hexdigest())
+
+
+def _labels(pairs):
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                         .replace('\n', '\\n'))
+        for key, value in pairs) + '}'
+
+
+def _number(value, scale=1):
+    """The device reports numbers as strings; None for anything else"""
+    try:
+        value = float(value) * scale
+    except (TypeError, ValueError):
+        return None
+    if value != value or value in (float('inf'), float('-inf')):
+        return None
+    return str(int(value)) if value.is_integer() and abs(value) < 2 ** 53 else repr(value)
+
+
+def _plc_lines(device, peers):
+    lines = {}
+    for peer in peers if isinstance(peers, list) else ():
+        if not isinstance(peer, dict):
+            continue
+        labels = _labels(device + [('peer_mac', peer.get('device_mac', '')),
+                                   ('peer_name', peer.get('device_name', ''))])
+        for key, name in (('rx_rate', 'tplink_wpa_plc_rx_rate_bits_per_second'),
+                          ('tx_rate', 'tplink_wpa_plc_tx_rate_bits_per_second')):
+            # the device reports Mbit/s, OpenMetrics wants base units
+            value = _number(peer.get(key), 1e6)
+            if value is not None:
+                lines.setdefault(name, []).append('{}{} {}\n'.format(name, labels, value))
+    return lines
+
+
+def _client_lines(device, clients):
+    if not isinstance(clients, list):
+        return {}
+    lines = {}
+    bands = dict.fromkeys(WIFI_BANDS, 0)
+    for client in clients:
+        if not isinstance(client, dict):
+            continue
+        band = client.get('type', 'unknown')
+        bands[band] = bands.get(band, 0) + 1
+        labels = _labels(device + [('band', band), ('mac', client.get('mac', '')),
+                                   ('name', client.get('devName', ''))])
+        for key, name in (('rxpkts', 'tplink_wpa_wifi_client_rx_packets'),
+                          ('txpkts', 'tplink_wpa_wifi_client_tx_packets')):
+            value = _number(client.get(key))
+            if value is not None:
+                lines.setdefault(name, []).append('{}_total{} {}\n'.format(name, labels, value))
+    lines['tplink_wpa_wifi_clients'] = [
+        'tplink_wpa_wifi_clients{} {}\n'.format(_labels(device + [('band', band)]), count)
+        for band, count in bands.items()]
+    return lines
+
+
+class Histogram(object):
+    """Cumulative latency histogram, only touched by the poll thread."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+
+    def lines(self, name, device):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            total += count
+            le = '+Inf' if bound is None else repr(float(bound))
+            lines.append('{}_bucket{} {}\n'.format(name, _labels(device + [('le', le)]), total))
+        labels = _labels(device)
+        lines.append('{}_count{} {}\n'.format(name, labels, total))
+        lines.append('{}_sum{} {!r}\n'.format(name, labels, self.sum))
+        return lines
+
+
+class DeviceMetrics(object):
+    """OpenMetrics samples of one device, rendered per family.
+
+    Built by the poll thread after every poll.  The samples of plc and
+    clients are taken over from the previous instance as long as the
+    ETag of their section did not change, a scrape only joins bytes.
+    """
+
+    __slots__ = ('families', 'sections')
+
+    def __init__(self, poller, previous=None):
+        snapshot = poller.snapshot
+        device = [('device', poller.target)]
+        labels = _labels(device)
+        lines = {
+            'tplink_wpa_up': ['tplink_wpa_up{} {}\n'.format(labels, int(snapshot.ok))],
+            'tplink_wpa_polls': ['tplink_wpa_polls_total{} {}\n'.format(labels, poller.polls)],
+            'tplink_wpa_poll_failures': [
+                'tplink_wpa_poll_failures_total{} {}\n'.format(labels, poller.failures)],
+            'tplink_wpa_poll_duration_seconds':
+                poller.poll_histogram.lines('tplink_wpa_poll_duration_seconds', device),
+            'tplink_wpa_login_duration_seconds':
+                poller.login_histogram.lines('tplink_wpa_login_duration_seconds', device),
+        }
+        if snapshot.polled_at is not None:
+            lines['tplink_wpa_last_poll_timestamp_seconds'] = [
+                'tplink_wpa_last_poll_timestamp_seconds{} {!r}\n'.format(
+                    labels, float(snapshot.polled_at))]
+        families = {name: ''.join(value).encode('utf-8') for name, value in lines.items()}
+
+        self.sections = {}
+        for section, render in (('plc', _plc_lines), ('clients', _client_lines)):
+            current = snapshot.sections.get(section)
+            if current is None:
+                continue
+            etag = current[1]
+            cached = previous.sections.get(section) if previous is not None else None
+            if cached is None or cached[0] != etag:
+                try:
+                    rendered = render(device, snapshot.values.get(section))
+                except Exception:
+                    # the rest of the device is still worth a scrape
+                    logger.exception('Cannot export %s of %s', section, poller.target)
+                    rendered = {}
+                cached = (etag, {name: ''.join(value).encode('utf-8')
+                                 for name, value in rendered.items()})
+            self.sections[section] = cached
+            families.update(cached[1])
+        self.families = families
+
+
+class Snapshot(object):
+    """Serialized state of one device, replaced as a whole after each poll.
+
+    Readers only take the reference, so they never see half an update
+    and never wait for a poll.  ``body`` is the whole device, ``sections``
+    maps the endpoint names to (body, etag) of the single values.
+    """
+
+    __slots__ = ('body', 'etag', 'sections', 'values', 'ok', 'error',
+                 'polled_at', 'changed_at')
+
+    def __init__(self, target, values, sections, ok, error, polled_at, changed_at):
+        self.values = values
+        self.sections = sections
+        self.ok = ok
+        self.error = error
+        self.polled_at = polled_at
+        self.changed_at = changed_at
+        # the section bodies are reused as they are, unchanged ones are
+        # not serialized again.  polled_at goes into a header instead, so
+        # the ETag stays the same as long as nothing changed.
+        head = json.dumps({
+            'target': target,
+            'ok': ok,
+            'error': error,
+            'changed_at': changed_at,
+        }, separators=(',', ':')).encode('utf-8')
+        data = b','.join(json.dumps(name).encode('utf-8') + b':' + body
+                         for name, (body, _etag) in sections.items())
+        self.body = head[:-1] + b',"data":{' + data + b'}}'
+        self.etag = _etag(self.body)
+
+    def summary(self, target):
+        return {
+            'target': target,
+            'ok': self.ok,
+            'error': self.error,
+            'polled_at': self.polled_at,
+            'changed_at': self.changed_at,
+            'etag': self.etag,
+        }
+
+
+class DevicePoller(object):
+    """Owns the session of one device and polls it every ``interval`` seconds.
+
+    Like the CLI's watch action it keeps the session between polls and
+    only gives it (and the lock file) up when another process on this
+    host waits for the device.
+    """
+
+    def __init__(self, target, password, endpoints=DEFAULT_ENDPOINTS, interval=30.0,
+                 timeout=TL_WPA4220.DEFAULT_TIMEOUT, use_lock=True):
+        self.target = target
+        self.interval = interval
+        self.device = TL_WPA4220(target, timeout=timeout)
+        self.polls = 0
+        self.failures = 0
+        self.last_poll_seconds = None
+        self.poll_histogram = Histogram(POLL_BUCKETS)
+        self.login_histogram = Histogram(LOGIN_BUCKETS)
+        self._password = password
+        self._endpoints = {name: WATCH_ENDPOINTS[name] for name in endpoints}
+        self._lock = DeviceLock(target) if use_lock else None
+        self._stop = threading.Event()
+        self._thread = None
+        self.snapshot = Snapshot(target, {}, {}, False, 'not polled yet', None, None)
+        self.metrics = DeviceMetrics(self)
+
+    def start(self, phase=0.0):
+        self._thread = threading.Thread(
+            target=self._run, args=(phase,), name='poll {}'.format(self.target), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            if self.device.logged_in():
+                self.device.logout()
+        except Exception as e:
+            logger.debug('Logout of %s failed: %s', self.target, e)
+        self.device.close()
+        if self._lock is not None:
+            self._lock.release()
+
+    def _run(self, phase):
+        if self._stop.wait(phase):
+            return
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                # a bug must neither end the polls nor leave the last
+                # snapshot looking fresh
+                error = '{}: {}'.format(type(e).__name__, e)
+                log = logger.debug if error == self.snapshot.error else logger.error
+                log('Poll of %s failed', self.target, exc_info=True)
+                self._fail(error)
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                # slower than the interval: skip the missed polls
+                next_at = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def poll(self):
+        start = time.perf_counter()
+        previous = self.snapshot
+        values = dict(previous.values)
+        error = None
+        try:
+            if self._lock is not None and not self._lock.locked:
+                while not self._lock.acquire(timeout=1.0):
+                    if self._stop.is_set():
+                        return
+            if not self.device.logged_in():
+                started = time.perf_counter()
+                try:
+                    self.device.login(self._password)
+                finally:
+                    self.login_histogram.observe(time.perf_counter() - started)
+            for result in self.device.fetch(self._endpoints):
+                # timed out: keep the last value
+                if not result.timed_out:
+                    values[result.name] = result.value
+        except Exception as e:
+            # logged in again on the next poll
+            self.device.forget_session()
+            if isinstance(e, requests.exceptions.RequestException):
+                error = describe_request_error(e)
+            elif isinstance(e, TL_WPA4220.TpError):
+                error = str(e)
+            else:
+                # unexpected answer, keep the traceback
+                error = '{}: {}'.format(type(e).__name__, e)
+                logger.debug('Poll of %s failed', self.target, exc_info=True)
+            self.failures += 1
+            # only once for the same error, a device that is off stays off
+            log = logger.debug if error == previous.error else logger.warning
+            log('Poll of %s failed: %s', self.target, error)
+        finally:
+            if self._lock is not None and self._lock.contended():
+                if self.device.logged_in():
+                    self.device.logout()
+                self._lock.release()
+        self.polls += 1
+        self.last_poll_seconds = time.perf_counter() - start
+        self.poll_histogram.observe(self.last_poll_seconds)
+        self._publish(previous, values, error)
+        self.metrics = DeviceMetrics(self, self.metrics)
+
+    def _fail(self, error):
+        """Keep the last data, but mark it as not current."""
+        self.failures += 1
+        previous = self.snapshot
+        now = round(time.time(), 3)
+        self.snapshot = Snapshot(
+            self.target, previous.values, previous.sections, False, error, now,
+            previous.changed_at if error == previous.error else now)
+        self.metrics = DeviceMetrics(self, self.metrics)
+
+    def _publish(self, previous, values, error):
+        sections = {}
+        for name, value in values.items():
+            body = json.dumps(value, default=str, separators=(',', ':')).encode('utf-8')
+            old = previous.sections.get(name)
+            sections[name] = old if old is not None and old[0] == body else (body, _etag(body))
+        changed = (sections != previous.sections or error != previous.error
+                   or previous.changed_at is None)
+        now = round(time.time(), 3)
+        self.snapshot = Snapshot(
+            self.target, values, sections, error is None, error,
+            now, now if changed else previous.changed_at)
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server_version = 'TL_WPA4220_proxy'
+
+    def log_message(self, format, *args):
+        logger.debug('%s - ' + format, self.address_string(), *args)
+
+    def _reply(self, body, etag=None, status=200, polled_at=None,
+               content_type='application/json'):
+        if etag is not None and self._not_modified(etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        # always revalidate, the ETag makes that cheap
+        self.send_header('Cache-Control', 'no-cache')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if polled_at is not None:
+            self.send_header('X-Polled-At', str(polled_at))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag):
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = [tag.strip() for tag in header.split(',')]
+        return '*' in tags or etag in tags or 'W/' + etag in tags
+
+    def _error(self, status, message):
+        self._reply(json.dumps({'error': message}).encode('utf-8'), status=status)
+
+    def do_GET(self):
+        parts = [unquote(p) for p in urlsplit(self.path).path.split('/') if p]
+        pollers = self.server.pollers
+        if parts in ([], ['devices']):
+            body = json.dumps([poller.snapshot.summary(target)
+                               for target, poller in pollers.items()],
+                              separators=(',', ':')).encode('utf-8')
+            return self._reply(body, _etag(body))
+        if parts == ['healthz']:
+            return self._reply(b'{"ok":true}')
+        if parts == ['metrics']:
+            body, etag = self.server.metrics()
+            return self._reply(body, etag, content_type=OPENMETRICS_TYPE)
+        if parts[0] != 'devices' or len(parts) > 3:
+            return self._error(404, 'unknown path')
+        poller = pollers.get(parts[1])
+        if poller is None:
+            return self._error(404, 'unknown device {}'.format(parts[1]))
+        snapshot = poller.snapshot
+        if len(parts) == 2:
+            return self._reply(snapshot.body, snapshot.etag, polled_at=snapshot.polled_at)
+        section = snapshot.sections.get(parts[2])
+        if section is None:
+            return self._error(404, 'no {} for {}'.format(parts[2], parts[1]))
+        return self._reply(section[0], section[1], polled_at=snapshot.polled_at)
+
+
+class ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, address, pollers):
+        self.pollers = {poller.target: poller for poller in pollers}
+        # (DeviceMetrics of every poller, body, etag) of the last scrape
+        self._metrics = None
+        super().__init__(address, ProxyHandler)
+
+    def metrics(self):
+        """OpenMetrics text of all devices, only joined again after a poll."""
+        rendered = tuple(poller.metrics for poller in self.pollers.values())
+        cached = self._metrics
+        if cached is not None and all(a is b for a, b in zip(cached[0], rendered)):
+            return cached[1], cached[2]
+        body = b''.join(
+            _METRIC_HEADERS[name] + b''.join(m.families.get(name, b'') for m in rendered)
+            for name, _kind, _text in METRIC_FAMILIES) + b'# EOF\n'
+        etag = _etag(body)
+        # concurrent scrapes may both build it, the result is the same
+        self._metrics = (rendered, body, etag)
+        return body, etag
+
+    def handle_error(self, request, client_address):
+        # readers going away are not our problem
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start_polling(self):
+        """Start the pollers, spread over one interval after the first one."""
+        for i, poller in enumerate(self.pollers.values()):
+            poller.start(phase=random.uniform(0, poller.interval) if i else 0.0)
+
+    def stop_polling(self):
+        for poller in self.pollers.values():
+            poller.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Caching proxy for TL-WPA4220 adapters')
+    parser.add_argument('target', type=str, metavar='target',
+                        help='IP of the device; several as ip1,ip2, a CIDR range or @file')
+    parser.add_argument('-p', '--password', type=str, default='admin',
+                        help='Password of the web interface (default: admin)')
+    parser.add_argument('-d', '--debug', action='store_true', default=False)
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--interval', type=float, default=30.0, metavar='seconds',
+                        help='Time between two polls of a device')
+    parser.add_argument('--endpoints', type=str, default=','.join(DEFAULT_ENDPOINTS),
+                        help='comma separated, any of ' + ','.join(WATCH_ENDPOINTS))
+    parser.add_argument('--timeout', type=float, default=TL_WPA4220.DEFAULT_TIMEOUT,
+                        help='Timeout of a single request in seconds')
+    parser.add_argument('--no-lock', action='store_true', default=False,
+                        help='Do not share the devices with other processes (lock file)')
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    if not endpoints or not set(endpoints) <= set(WATCH_ENDPOINTS):
+        parser.error(f'--endpoints takes {",".join(WATCH_ENDPOINTS)}')
+    targets = expand_targets(args.target)
+    if not targets:
+        parser.error('no target')
+
+    level = logging.DEBUG if args.debug else logging.WARNING
+    install_cli_logging(level)
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(level)
+
+    server = ProxyServer((args.bind, args.port), [
+        DevicePoller(target, args.password, endpoints, args.interval, args.timeout,
+                     use_lock=not args.no_lock)
+        for target in targets])
+    server.start_polling()
+    print('Serving {} device(s) on http://{}:{}/devices'.format(
+        len(targets), *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop_polling()
@@ -0,0 +1,517 @@
+#!/bin/env python3
+
+# Local stand-in for a TL-WPA4220/TL-WPA8630P web interface
+# License: LGPL-2.1 (same as TL_WPA4220.py)
+#
+# Speaks the same encrypted protocol as the device (RSA key/seq issued by
+# login?form=auth, RSA-encrypted sign, AES-CBC encrypted data) so the
+# client and the Home Assistant pipeline can be load-tested without
+# hardware:
+#
+#   python3 TL_WPA4220_sim.py serve --port 8080 --clients 200 --plc-peers 4
+#   python3 TL_WPA4220.py -p admin 127.0.0.1:8080 show
+#   python3 TL_WPA4220_sim.py bench --clients 200 -n 200
+#   python3 TL_WPA4220_sim.py bench-sign
+#   python3 TL_WPA4220_sim.py bench-memory -n 2000
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from Crypto.Cipher import AES
+from Crypto.Util.number import getPrime, inverse
+
+
+class SimConfig(object):
+    def __init__(self, password='admin', clients=20, plc_peers=2, latency=0.0,
+                 jitter=0.0, error_rate=0.0, seed=None, model='TL-WPA8630P', wifi=True):
+        self.password = password
+        self.clients = clients
+        self.plc_peers = plc_peers
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.model = model
+        self.wifi = wifi
+
+
+class DeviceState(object):
+    """What the device knows: RSA key, seq, the single admin session, data."""
+
+    # The device only ever has one admin session, a new login replaces it
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.n, self.e, self.d = self._rsa_key()
+        self.seq = self.random.randint(100000000, 999999999)
+        self.password_hash = hashlib.md5(config.password.encode('utf-8')).hexdigest()
+        self.session = None  # (key, iv)
+        self.requests = 0
+        self.errors = 0
+        self.led = 'on'
+        self.data = self._build_data()
+
+    def _rsa_key(self):
+        # 512 bit like the real firmware; n >= 2**511 so every 64 byte
+        # ASCII block of the client is smaller than n
+        e = 65537
+        while True:
+            p, q = getPrime(256), getPrime(256)
+            n = p * q
+            phi = (p - 1) * (q - 1)
+            if p != q and n.bit_length() == 512 and phi % e:
+                return n, e, inverse(e, phi)
+
+    def _mac(self, prefix, i):
+        return '{}-{:02X}-{:02X}'.format(prefix, (i >> 8) & 0xff, i & 0xff)
+
+    def _build_data(self):
+        rnd = self.random
+        clients = []
+        for i in range(self.config.clients):
+            clients.append({
+                'mac': self._mac('50-C7-BF-00', i),
+                'devName': 'client-{}'.format(i),
+                'ip': '192.168.{}.{}'.format(1 + i // 250, 2 + i % 250) if i % 7 else 'unknown',
+                'type': '2.4GHz' if i % 2 else '5GHz',
+                'rxpkts': str(rnd.randint(0, 10 ** 6)),
+                'txpkts': str(rnd.randint(0, 10 ** 6)),
+            })
+        peers = []
+        for i in range(self.config.plc_peers):
+            peers.append({
+                'device_mac': self._mac('98-DA-C4-00', i),
+                'device_name': 'plc-{}'.format(i),
+                'rx_rate': str(rnd.randint(50, 1300)),
+                'tx_rate': str(rnd.randint(50, 1300)),
+                'status': 'on',
+            })
+        data = {
+            'admin/firmware?form=upgrade': {
+                'model': self.config.model,
+                'firmware_version': '2.0.3 Build 20170608 Rel. 57352',
+                'hardware_version': 'TL-WPA8630P v2 00000000',
+                'is_default': False,
+            },
+            'admin/wlan_status': {
+                'wireless_2g_enable': 'on', 'wireless_5g_enable': 'on',
+                'wireless_2g_ssid': 'sim-2g', 'wireless_5g_ssid': 'sim-5g',
+                'wireless_2g_channel': '6', 'wireless_5g_channel': '36',
+                'wireless_2g_pwd': 'simulated', 'wireless_5g_pwd': 'simulated',
+                'wireless_2g_macaddr': '98-DA-C4-FF-00-01',
+                'wireless_5g_macaddr': '98-DA-C4-FF-00-02',
+            },
+            'admin/wireless?form=statistics': clients,
+            'admin/powerline?form=plc_device': peers,
+            'admin/powerline?form=plc_local': {
+                'macaddr': '98-DA-C4-FF-00-00', 'password': 'SIMULATE-DKEY',
+                'networkname': 'HomePlugAV',
+            },
+            'admin/wireless?form=region': {'region': 'DE'},
+            'admin/locale?form=list': {'list': ['en_US', 'de_DE']},
+            'admin/locale?form=index_lang': {'locale': 'en_US'},
+            'data/profile.json': {},
+            'admin/lanCfg': {'lan_type': 'dynamic', 'lan_ip': '192.168.1.2',
+                             'lan_mask': '255.255.255.0', 'lan_gw': '192.168.1.1'},
+            'admin/dhcps?form=setting': {'enable': 'off'},
+            'admin/dhcps?form=client': [],
+            'admin/guest?form=guest_2g': {'guest_2g_enable': 'off', 'guest_2g_ssid': 'sim-guest'},
+            'admin/guest?form=guest_5g': {'guest_5g_enable': 'off', 'guest_5g_ssid': 'sim-guest-5g'},
+            'admin/wifiMove.json': {'enable': 'off'},
+            'admin/wifiTimeEnable': {'enable': 'off'},
+            'admin/wifiTimeControl': {},
+            'admin/syslog?form=log': [],
+            'admin/syslog?form=filter': {'type': 'ALL', 'level': 'ALL'},
+            'admin/wireless?form=maclist': [],
+        }
+        if not self.config.wifi:
+            # like the TL-PA9020P: powerline only
+            for path in ('admin/wlan_status', 'admin/wireless?form=statistics',
+                         'admin/guest?form=guest_2g', 'admin/guest?form=guest_5g',
+                         'admin/wifiMove.json', 'admin/wifiTimeEnable',
+                         'admin/wifiTimeControl'):
+                del data[path]
+        return data
+
+    def rsa_decrypt(self, hexstr):
+        # The client does not zero-pad its cipher blocks, so a block may be
+        # shorter than 128 hex digits (and the first one a digit longer if
+        # the whole string got a '0' prepended): try the possible boundaries.
+        size = (self.n.bit_length() + 3) // 4
+        if len(hexstr) % 2 == 0 and hexstr.startswith('0'):
+            hexstr = hexstr[1:]
+
+        def block(h):
+            if not h:
+                return None
+            m = pow(int(h, 16), self.d, self.n)
+            if m.bit_length() > 512:
+                return None
+            m = m.to_bytes(64, 'big').rstrip(b'\0')
+            return m.decode('ascii') if all(0x20 <= b < 0x7f for b in m) else None
+
+        def split(h):
+            if len(h) <= size:
+                return block(h)
+            for width in range(size, size - 8, -1):
+                first = block(h[:width])
+                if first is not None:
+                    rest = split(h[width:])
+                    if rest is not None:
+                        return first + rest
+            return None
+
+        return split(hexstr)
+
+    def aes_encrypt(self, key, iv, plaintext):
+        pad = AES.block_size - len(plaintext) % AES.block_size
+        padded = (plaintext + pad * chr(pad)).encode('utf-8')
+        return base64.b64encode(AES.new(key, AES.MODE_CBC, iv).encrypt(padded)).decode()
+
+    def aes_decrypt(self, key, iv, encrypted):
+        plaintext = AES.new(key, AES.MODE_CBC, iv).decrypt(base64.b64decode(encrypted))
+        # a wrong key (session taken over) shows up as broken padding
+        pad = plaintext[-1]
+        if not 1 <= pad <= AES.block_size or plaintext[-pad:] != bytes([pad]) * pad:
+            raise ValueError('bad padding')
+        return plaintext[:-pad].decode('utf-8')
+
+    def handle(self, path, operation, data):
+        """Result data of an authenticated request, or raises KeyError."""
+        if path == 'admin/ledSettings?form=enable':
+            if operation == 'write':
+                self.led = data.get('toggle', self.led)
+            return {'enable': self.led}
+        if path in ('admin/logout.htm', 'admin/reboot.json'):
+            self.session = None
+            return {}
+        if operation in ('write', 'insert'):
+            current = self.data.get(path)
+            if isinstance(current, dict):
+                current.update({k: v for k, v in data.items() if k != 'operation'})
+            return current if current is not None else {}
+        return self.data[path]
+
+
+class SimHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server_version = 'lighttpd'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, obj, status=200):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            # the client asked for it (Connection: close); say so, or it may
+            # reuse the socket we are about to close
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_encrypted(self, key, iv, obj):
+        self._reply({'data': self.state.aes_encrypt(key, iv, json.dumps(obj))})
+
+    def _inject(self):
+        cfg = self.state.config
+        delay = cfg.latency + (self.state.random.uniform(-cfg.jitter, cfg.jitter) if cfg.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if cfg.error_rate and self.state.random.random() < cfg.error_rate:
+            return self.state.random.choice(('http', 'errorcode', 'drop'))
+        return None
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+        path = self.path.lstrip('/')
+        state = self.state
+        with state.lock:
+            state.requests += 1
+
+        error = self._inject()
+        if error:
+            with state.lock:
+                state.errors += 1
+        if error == 'drop':
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if error == 'http':
+            return self._reply({'success': False}, status=500)
+
+        if path == 'login?form=auth':
+            return self._reply({'success': True, 'data': {
+                'key': ['{:x}'.format(state.n), '{:x}'.format(state.e)],
+                'seq': state.seq,
+            }})
+
+        sign = state.rsa_decrypt(form.get('sign', ''))
+        sign = dict(parse_qsl(sign)) if sign else {}
+        encrypted = form.get('data') or ''
+        with state.lock:
+            if 'k' in sign and 'i' in sign:
+                if path != 'login?form=login':
+                    return self._reply({'success': False}, status=403)
+                state.session = (sign['k'].encode(), sign['i'].encode())
+            session = state.session
+        if session is None:
+            return self._reply({'success': False, 'errorcode': 'timeout'}, status=403)
+        key, iv = session
+
+        try:
+            request = dict(parse_qsl(state.aes_decrypt(key, iv, encrypted)))
+        except Exception:
+            # wrong key: another admin took over the session
+            return self._reply({'success': False, 'errorcode': 'timeout'}, status=403)
+
+        if (sign.get('h') != state.password_hash
+                or sign.get('s') != str(state.seq + len(encrypted))):
+            return self._reply_encrypted(key, iv, {'success': False, 'errorcode': 'timeout'})
+        if error == 'errorcode':
+            return self._reply_encrypted(key, iv, {'success': False, 'errorcode': 'simulated'})
+
+        operation = request.get('operation')
+        if path == 'login?form=login':
+            password = state.rsa_decrypt(request.get('password', ''))
+            if password != state.config.password:
+                with state.lock:
+                    state.session = None
+                return self._reply_encrypted(key, iv, {'success': False, 'errorcode': 'login failed'})
+            return self._reply_encrypted(key, iv, {'success': True, 'data': {}})
+
+        try:
+            data = state.handle(path, operation, request)
+        except KeyError:
+            return self._reply_encrypted(key, iv, {'success': False, 'errorcode': 'not supported'})
+        return self._reply_encrypted(key, iv, {'success': True, 'data': data})
+
+
+class SimServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, address, config):
+        self.state = DeviceState(config)
+        super().__init__(address, SimHandler)
+
+    def handle_error(self, request, client_address):
+        # clients giving up (timeouts, deadlines) are part of the game
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def target(self):
+        host, port = self.server_address[:2]
+        return '{}:{}'.format(host, port)
+
+    def start(self):
+        """Serve from a background thread, returns the target for the client."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self.target
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+def _legacy_rsa_encrypt(plaintext, e, n):
+    # _rsa_encrypt as shipped up to v1.0.5, reference for bench_sign
+    encrypted = ''
+    for i in range(len(plaintext) // 64 + 1):
+        block = plaintext[i * 64:(i + 1) * 64]
+        encoded = [format(ord(c), 'x') for c in block] + ['00'] * (64 - len(block))
+        encoded = int("".join(encoded), 16)
+        encrypted_block = pow(encoded, e, n)
+        encrypted += format(encrypted_block, 'x')
+    if len(encrypted) % 2 == 1:
+        encrypted = '0' + encrypted
+    return encrypted
+
+
+def bench_sign(rounds, seed=None):
+    """Per request signing cost of TL_WPA4220._rsa_encrypt vs. the old code."""
+    import timeit
+    from TL_WPA4220 import TL_WPA4220
+
+    state = DeviceState(SimConfig(clients=0, plc_peers=0, seed=seed))
+    device = TL_WPA4220('127.0.0.1')
+    device._set_rsa_pubkey_seq({'success': True, 'data': {
+        'key': ['{:x}'.format(state.n), '{:x}'.format(state.e)], 'seq': state.seq}})
+
+    rnd = random.Random(seed)
+    alphabet = [chr(c) for c in range(1, 0x250)] + ['\u20ac', '\U0001f600']
+    samples = ['h={}&s={}'.format(state.password_hash, state.seq + i) for i in range(0, 400, 8)]
+    samples += [''.join(rnd.choice(alphabet) for _j in range(length))
+                for length in (0, 1, 63, 64, 65, 127, 128, 129, 200) for _k in range(20)]
+    for sample in samples:
+        device._rsa_cache.clear()
+        if device._rsa_encrypt(sample) != _legacy_rsa_encrypt(sample, state.e, state.n):
+            raise AssertionError('Output differs for {!r}'.format(sample))
+
+    sign = 'h={}&s={}'.format(state.password_hash, state.seq + 24)
+    legacy = timeit.timeit(lambda: _legacy_rsa_encrypt(sign, state.e, state.n), number=rounds)
+
+    def uncached():
+        device._rsa_cache.clear()
+        device._rsa_encrypt(sign)
+    fresh = timeit.timeit(uncached, number=rounds)
+    cached = timeit.timeit(lambda: device._rsa_encrypt(sign), number=rounds)
+
+    print('{} samples byte-identical'.format(len(samples)))
+    print('legacy:           {:8.2f} us/sign'.format(legacy / rounds * 1e6))
+    print('bytes path:       {:8.2f} us/sign'.format(fresh / rounds * 1e6))
+    print('session cached:   {:8.2f} us/sign'.format(cached / rounds * 1e6))
+
+
+def bench(config, polls, keep_alive=True):
+    # Imported here so `serve` does not need the client around
+    from TL_WPA4220 import TL_WPA4220
+    from models import ClientIndex, PlcSnapshot
+
+    server = SimServer(('127.0.0.1', 0), config)
+    target = server.start()
+    device = TL_WPA4220(target, keep_alive=keep_alive)
+
+    t = time.perf_counter()
+    device.login(config.password)
+    login_time = time.perf_counter() - t
+
+    poll_times, parse_times, failures = [], [], 0
+    started = time.perf_counter()
+    for _i in range(polls):
+        t = time.perf_counter()
+        try:
+            device.get_firmware_info()
+            plc = device.get_plc_device_status()
+            device.get_wlan_status()
+            clients = device.get_wifi_clients()
+        except Exception:
+            failures += 1
+            continue
+        t2 = time.perf_counter()
+        PlcSnapshot.from_status(plc)
+        ClientIndex.from_status(clients).top(None, 12)
+        parse_times.append(time.perf_counter() - t2)
+        poll_times.append(t2 - t)
+    elapsed = time.perf_counter() - started
+    device.logout()
+    device.close()
+    server.shutdown()
+
+    print('login:            {:8.2f} ms'.format(login_time * 1000))
+    print('polls:            {} ok, {} failed, {:.1f} polls/s, {:.1f} req/s'.format(
+        len(poll_times), failures, len(poll_times) / elapsed, 4 * len(poll_times) / elapsed))
+    if poll_times:
+        print('poll latency:     p50 {:.2f} ms  p95 {:.2f} ms  max {:.2f} ms'.format(
+            _percentile(poll_times, 50) * 1000, _percentile(poll_times, 95) * 1000,
+            max(poll_times) * 1000))
+        print('snapshot parsing: mean {:.3f} ms ({} clients, {} PLC peers)'.format(
+            statistics.mean(parse_times) * 1000, config.clients, config.plc_peers))
+
+
+def bench_memory(config, polls, limit=64 * 1024):
+    """Login/read/logout with a new client per poll, like the integration did.
+
+    Fails (exit code 1) if the client's allocations grow by more than
+    ``limit`` bytes between the warm-up and the last poll, or if handlers
+    pile up on its logger.
+    """
+    import logging
+    import tracemalloc
+    from TL_WPA4220 import TL_WPA4220
+
+    server = SimServer(('127.0.0.1', 0), config)
+    target = server.start()
+    logger = logging.getLogger(TL_WPA4220.__name__)
+    handlers = len(logger.handlers)
+    client_files = [tracemalloc.Filter(True, '*TL_WPA4220.py'),
+                    tracemalloc.Filter(True, '*logging*')]
+
+    def poll():
+        device = TL_WPA4220(target)
+        device.login(config.password)
+        device.get_plc_device_status()
+        device.logout()
+        device.close()
+
+    tracemalloc.start()
+    warmup = max(1, polls // 10)
+    for _i in range(warmup):
+        poll()
+    before = tracemalloc.take_snapshot().filter_traces(client_files)
+    for _i in range(polls - warmup):
+        poll()
+    after = tracemalloc.take_snapshot().filter_traces(client_files)
+    tracemalloc.stop()
+    server.shutdown()
+
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    added = len(logger.handlers) - handlers
+    print('{} polls: client memory {:+d} bytes after warm-up, {:+d} log handlers'.format(
+        polls, growth, added))
+    if growth > limit or added:
+        for stat in after.compare_to(before, 'traceback')[:5]:
+            print(stat)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulated TL-WPA4220 web interface')
+    parser.add_argument('action', choices=['serve', 'bench', 'bench-sign', 'bench-memory'], nargs='?', default='serve')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-p', '--password', default='admin')
+    parser.add_argument('--clients', type=int, default=20, help='Number of Wi-Fi clients')
+    parser.add_argument('--plc-peers', type=int, default=2, help='Number of PLC peers')
+    parser.add_argument('--latency', type=float, default=0.0, help='Response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Probability of an injected error (HTTP 500, error code or dropped connection)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--model', default='TL-WPA8630P')
+    parser.add_argument('--no-wifi', action='store_true', default=False,
+                        help='Powerline only model without the Wi-Fi endpoints')
+    parser.add_argument('-n', '--polls', type=int, default=None,
+                        help='bench: number of polls (default 100, bench-memory: 2000, bench-sign: rounds)')
+    parser.add_argument('--no-keep-alive', action='store_true', default=False)
+    args = parser.parse_args()
+
+    config = SimConfig(password=args.password, clients=args.clients,
+                       plc_peers=args.plc_peers, latency=args.latency,
+                       jitter=args.jitter, error_rate=args.error_rate, seed=args.seed,
+                       model=args.model, wifi=not args.no_wifi)
+    if args.action == 'bench-sign':
+        bench_sign(args.polls or 10000, seed=args.seed)
+    elif args.action == 'bench-memory':
+        bench_memory(config, args.polls or 2000)
+    elif args.action == 'bench':
+        bench(config, args.polls or 100, keep_alive=not args.no_keep_alive)
+    else:
+        server = SimServer((args.host, args.port), config)
+        print('Simulating {} on {}'.format(config.model, server.target))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
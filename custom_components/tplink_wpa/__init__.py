@@ -6,24 +6,35 @@ from .const import DOMAIN
 
 _LOGGER = logging.getLogger(__name__)
 
-from .TL_WPA4220 import TL_WPA4220
+from .coordinator import TPLinkCoordinator
+from .fleet import FleetScheduler
+from .session import TPLinkSessionManager
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up TP-Link WPA4220 from a config entry."""
-    #ip_address = entry.data["ip_address"]
-    #password = entry.data["password"]
-
-    #device = TL_WPA4220(ip_address)
+    ip_address = entry.data["ip_address"]
+    password = entry.data["password"]
 
     try:
-        #await hass.async_add_executor_job(device.login,password)
-        #hass.data[DOMAIN] = device
-        _LOGGER.info("Connected to TP-Link WPA4220")
+        # Login happens lazily on the first poll and the session is kept
+        # open across polls (see session.py)
+        session = TPLinkSessionManager(hass, ip_address, password)
+        coordinator = TPLinkCoordinator(hass, entry, session)
+        hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
+        _LOGGER.info("Setting up TP-Link WPA4220")
     except Exception as e:
-        _LOGGER.error(f"Error connecting to TP-Link WPA4220: {e}")
+        _LOGGER.error(f"Error setting up TP-Link WPA4220: {e}")
         return False
 
+    # errors show up as "error" state on the status sensor, no setup retry
+    fleet = FleetScheduler.async_get(hass)
+    fleet.async_add(entry.entry_id, coordinator)
+    await fleet.async_poll(entry.entry_id)
+    if coordinator.last_update_success:
+        _LOGGER.info("Connected to TP-Link WPA4220")
+    coordinator.liveness.async_start()
+
     hass.async_create_task(
         hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
     )
@@ -31,10 +42,13 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
-    #device = hass.data.pop(DOMAIN, None)
-    #if device:
-    #    await hass.async_add_executor_job(device.logout)
+    unloaded = await hass.config_entries.async_forward_entry_unload(entry, "sensor")
 
-    await hass.config_entries.async_forward_entry_unload(entry, "sensor")
-    return True
+    FleetScheduler.async_get(hass).async_remove(entry.entry_id)
+
+    coordinator = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+    if coordinator:
+        coordinator.liveness.async_stop()
+        await coordinator.session.async_close()
 
+    return unloaded
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """Consecutive poll failures of one device with exponential backoff.
+
+    After ``threshold`` failures in a row the breaker opens; from then on a
+    probe is only due after a backoff that doubles with every further
+    failure (``backoff_min`` .. ``backoff_max``, +/- ``jitter``).  Any
+    success closes it again.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        backoff_min: float,
+        backoff_max: float,
+        jitter: float = 0.2,
+    ):
+        self._threshold = max(1, threshold)
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._jitter = jitter
+        self.failures = 0
+        self.backoff: float | None = None
+        self._retry_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        return OPEN if self.failures >= self._threshold else CLOSED
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def probe_due(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return self._retry_at is None or now >= self._retry_at
+
+    def allow_probe(self) -> None:
+        """Make the next probe due right away (backoff and failures stay)."""
+        self._retry_at = None
+
+    def record_success(self) -> bool:
+        """Returns True if this closed the breaker."""
+        was_open = self.is_open
+        self.failures = 0
+        self.backoff = None
+        self._retry_at = None
+        return was_open
+
+    def record_failure(self, now: float | None = None) -> bool:
+        """Returns True if this opened the breaker."""
+        was_open = self.is_open
+        self.failures += 1
+        if not self.is_open:
+            return False
+        now = time.monotonic() if now is None else now
+        self.backoff = min(
+            self._backoff_max,
+            self._backoff_min * 2 ** (self.failures - self._threshold),
+        )
+        self._retry_at = now + self.backoff * random.uniform(
+            1 - self._jitter, 1 + self._jitter
+        )
+        return not was_open
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "backoff": round(self.backoff) if self.backoff is not None else None,
+        }
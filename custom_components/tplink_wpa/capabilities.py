@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import asyncio
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_KEY = f"{DOMAIN}.capabilities"
+STORAGE_VERSION = 1
+
+DATA_CAPABILITIES = f"{DOMAIN}_capabilities"
+
+
+class CapabilityStore:
+    """Unsupported endpoints per model/firmware, kept in HA storage.
+
+    Shared by all config entries, so a fleet of identical adapters is probed
+    once; a firmware update changes the key and leads to a new probe.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data: dict[str, list[str]] | None = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    @callback
+    def async_get(hass: HomeAssistant) -> CapabilityStore:
+        if DATA_CAPABILITIES not in hass.data:
+            hass.data[DATA_CAPABILITIES] = CapabilityStore(hass)
+        return hass.data[DATA_CAPABILITIES]
+
+    async def async_lookup(self, key: str) -> list[str] | None:
+        await self._async_load()
+        return self._data.get(key)
+
+    async def async_save(self, key: str, unsupported: list[str]) -> None:
+        await self._async_load()
+        self._data[key] = list(unsupported)
+        await self._store.async_save(self._data)
+
+    async def _async_load(self) -> None:
+        async with self._lock:
+            if self._data is None:
+                self._data = await self._store.async_load() or {}
@@ -7,7 +7,7 @@ from homeassistant.helpers.entity import Entity
 from homeassistant.helpers import selector
 
 
-from .const import DOMAIN
+from .const import DOMAIN, LIVENESS_INTERVAL
             
 import logging
 
@@ -66,6 +66,12 @@ class TPLinkOptionsFlowHandler(config_entries.OptionsFlow):
             ): selector.NumberSelector(
                 selector.NumberSelectorConfig(min=1, max=100, step=1, mode="box")
             ),            
+            vol.Optional(
+                "liveness_interval",
+                default=int(options.get("liveness_interval", LIVENESS_INTERVAL.total_seconds())),
+            ): selector.NumberSelector(
+                selector.NumberSelectorConfig(min=0, max=300, step=1, mode="box", unit_of_measurement="s")
+            ),
            
         })
 
@@ -1,5 +1,45 @@
+from datetime import timedelta
+
 DOMAIN = "tplink_wpa"
 
 # Weitere Konstante könnten hier hinzugefügt werden, z.B.:
 DEFAULT_PASSWORD = "admin"
 
+SCAN_INTERVAL = timedelta(minutes=2)
+
+# Zeitbudget für einen kompletten Poll (Login + Reads), jeder Request
+# bekommt nur die verbleibende Zeit
+POLL_BUDGET = timedelta(seconds=20)
+
+# max. gleichzeitige Polls über alle Geräte (Config Entries) hinweg
+FLEET_MAX_CONCURRENT = 4
+
+# Circuit Breaker: nach so vielen Fehlern in Folge wird statt des vollen
+# Polls nur noch login?form=auth geprüft, mit exponentiellem Backoff
+BREAKER_THRESHOLD = 2
+BREAKER_BACKOFF_MIN = timedelta(minutes=2)
+BREAKER_BACKOFF_MAX = timedelta(minutes=30)
+
+# Liveness-Ping (login?form=auth, ohne Login) zwischen den Polls;
+# Intervall per Option einstellbar, 0 = aus. Nach LIVENESS_MISSES
+# unbeantworteten Pings in Folge gilt das Gerät als offline.
+LIVENESS_INTERVAL = timedelta(seconds=10)
+LIVENESS_TIMEOUT = timedelta(seconds=5)
+LIVENESS_MISSES = 2
+
+# Refresh-Intervall pro Endpoint (None = bei jedem Poll).
+# FirmwareInfo wird zusätzlich bei jedem neuen Login neu gelesen.
+REFRESH_INTERVALS = {
+    "FirmwareInfo": timedelta(days=1),
+    "WlanStatus": timedelta(minutes=15),
+    "WifiClients": None,
+    "PlcDeviceStatus": None,
+}
+
+# Client-Methode pro Endpoint/Section
+SECTION_METHODS = {
+    "FirmwareInfo": "get_firmware_info",
+    "WlanStatus": "get_wlan_status",
+    "WifiClients": "get_wifi_clients",
+    "PlcDeviceStatus": "get_plc_device_status",
+}
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import MappingProxyType
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .breaker import CircuitBreaker
+from .const import (
+    BREAKER_BACKOFF_MAX,
+    BREAKER_BACKOFF_MIN,
+    BREAKER_THRESHOLD,
+    DOMAIN,
+    LIVENESS_INTERVAL,
+    POLL_BUDGET,
+    SECTION_METHODS,
+)
+from .fleet import DATA_FLEET
+from .lease import PRIORITY_POLL
+from .liveness import LivenessMonitor
+from .models import ClientIndex, PlcSnapshot, norm_mac
+from .publish import PublishStats
+from .TL_WPA4220 import TL_WPA4220
+
+_LOGGER = logging.getLogger(__name__)
+
+SECTIONS = tuple(SECTION_METHODS)
+
+
+def _fingerprint(value) -> str:
+    raw = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def liveness_interval(options) -> timedelta:
+    seconds = (options or {}).get("liveness_interval")
+    if seconds is None:
+        return LIVENESS_INTERVAL
+    return timedelta(seconds=int(seconds))
+
+
+class PollTimeout(UpdateFailed):
+    """The poll did not finish within POLL_BUDGET."""
+
+
+class DeviceUnreachable(UpdateFailed):
+    """The circuit breaker is open, only the liveness probe runs."""
+
+
+@dataclass(frozen=True)
+class WpaSnapshot:
+    """Immutable result of one refresh."""
+
+    status: MappingProxyType
+    plc: PlcSnapshot = field(default_factory=PlcSnapshot)
+    clients: ClientIndex = field(default_factory=ClientIndex)
+    fingerprints: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    # sections whose request timed out on this poll (cached values shown)
+    timed_out: frozenset = frozenset()
+
+
+class TPLinkCoordinator(DataUpdateCoordinator[WpaSnapshot]):
+    """Polls one device and notifies only entities whose sections changed.
+
+    Entities pass the sections they read as listener context (``None`` =
+    all sections); after a refresh every section is fingerprinted and
+    listeners are only called for sections whose fingerprint differs from
+    the previous snapshot.
+    """
+
+    def __init__(self, hass: HomeAssistant, config_entry, session):
+        # no update_interval: polls are scheduled by the FleetScheduler
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {session.ip}",
+        )
+        self.session = session
+        self.ip = session.ip
+        self.top_n = int((config_entry.options or {}).get("top_n", 12))
+        self._entry = config_entry
+        self._changed: frozenset[str] | None = None
+        # state writes of this device's entities (see publish.py)
+        self.publish_stats = PublishStats()
+        self.breaker = CircuitBreaker(
+            BREAKER_THRESHOLD,
+            BREAKER_BACKOFF_MIN.total_seconds(),
+            BREAKER_BACKOFF_MAX.total_seconds(),
+        )
+        # pings between the polls, started by async_setup_entry
+        self.liveness = LivenessMonitor(
+            hass,
+            session,
+            liveness_interval(config_entry.options),
+            self._async_device_back,
+        )
+
+    async def _async_update_data(self) -> WpaSnapshot:
+        if self.breaker.is_open:
+            await self._async_probe()
+        try:
+            snapshot = await self._async_timed_poll()
+        except Exception:
+            if self.breaker.record_failure():
+                _LOGGER.warning(
+                    "%s failed %d polls in a row, only probing it from now on",
+                    self.ip,
+                    self.breaker.failures,
+                )
+            raise
+        self.breaker.record_success()
+        return snapshot
+
+    async def _async_probe(self) -> None:
+        """Unauthenticated liveness probe instead of a poll while the breaker is open.
+
+        Returns (and the full poll runs right away) once the device answers.
+        """
+        if not self.breaker.probe_due():
+            # same message every time: no new state/attributes to write
+            raise DeviceUnreachable(f"{self.ip} unreachable, polling paused")
+        try:
+            with self.session.deadline(POLL_BUDGET.total_seconds()):
+                await self.session.async_ping()
+        except Exception as err:
+            self.breaker.record_failure()
+            _LOGGER.debug("Probe of %s failed: %s", self.ip, err)
+            raise DeviceUnreachable(f"{self.ip} unreachable, polling paused") from err
+        _LOGGER.info("%s answers again, resuming polls", self.ip)
+
+    @callback
+    def _async_device_back(self) -> None:
+        """The liveness monitor got an answer again: poll right away."""
+        self.breaker.allow_probe()
+        if fleet := self.hass.data.get(DATA_FLEET):
+            fleet.async_request_poll(self._entry.entry_id)
+
+    async def _async_timed_poll(self) -> WpaSnapshot:
+        start = time.perf_counter()
+        budget = POLL_BUDGET.total_seconds()
+        ok = False
+        try:
+            # requests get the remaining budget, whatever is still running
+            # or not started when it is used up gets cancelled; waiting for
+            # a write or the CLI to finish counts against it as well
+            async with asyncio.timeout(budget), self.session.lease(PRIORITY_POLL):
+                with self.session.deadline(budget - (time.perf_counter() - start)):
+                    snapshot = await self._async_poll()
+            ok = True
+            return snapshot
+        except (TimeoutError, TL_WPA4220.DeadlineExceeded) as err:
+            raise PollTimeout(
+                f"Poll of {self.ip} did not finish within {budget:g}s"
+            ) from err
+        finally:
+            # "poll" next to the per-request timings of the client
+            self.session.stats.request("poll", time.perf_counter() - start, ok)
+
+    async def _async_poll(self) -> WpaSnapshot:
+        # after a failed refresh every section counts as changed
+        last = self.data if self.last_update_success else None
+        schedule = self.session.schedule
+        # Only endpoints whose refresh interval elapsed are fetched,
+        # the others come from the schedule's cache
+        due = schedule.due()
+        fetched = set()
+        timed_out = set()
+        if "FirmwareInfo" in due:
+            # model/firmware decide which endpoints are requested at all
+            due.remove("FirmwareInfo")
+            try:
+                value = await self.session.async_call(SECTION_METHODS["FirmwareInfo"])
+            except TL_WPA4220.RequestTimeout:
+                timed_out.add("FirmwareInfo")  # retried on the next poll
+            else:
+                schedule.store("FirmwareInfo", value)
+                fetched.add("FirmwareInfo")
+        await self.session.async_apply_capabilities(schedule.values()["FirmwareInfo"])
+
+        # one batch: a rejected session is logged in again once for all
+        bundle = await self.session.async_call(
+            "fetch", {section: SECTION_METHODS[section] for section in due}
+        )
+        for result in bundle:
+            if result.timed_out:
+                timed_out.add(result.name)
+            else:
+                schedule.store(result.name, result.value)
+                fetched.add(result.name)
+
+        cached = schedule.values()
+        previous = last.fingerprints if last else {}
+        fingerprints = {
+            section: _fingerprint(cached[section])
+            if section in fetched or section not in previous
+            else previous[section]
+            for section in SECTIONS
+        }
+        self._changed = frozenset(
+            s for s in SECTIONS if fingerprints[s] != previous.get(s)
+        )
+
+        # copy, the password masking below must not touch the cache
+        wls_data = cached["WlanStatus"]
+        if isinstance(wls_data, dict):
+            wls_data = dict(wls_data)
+            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            wls_data["wireless_2g_pwd"] = f"hidden ({now_str})"
+            wls_data["wireless_5g_pwd"] = f"hidden ({now_str})"
+
+        status = {
+            "FirmwareInfo": cached["FirmwareInfo"],
+            "WlanStatus": wls_data,
+            "WifiClients": cached["WifiClients"],
+            "PlcDeviceStatus": cached["PlcDeviceStatus"],
+        }
+
+        if self._changed & {"FirmwareInfo", "WlanStatus"}:
+            self._update_device_registry(status["FirmwareInfo"], wls_data)
+
+        return WpaSnapshot(
+            status=MappingProxyType(status),
+            plc=PlcSnapshot.from_status(status["PlcDeviceStatus"])
+            if "PlcDeviceStatus" in self._changed
+            else last.plc,
+            clients=ClientIndex.from_status(status["WifiClients"])
+            if "WifiClients" in self._changed
+            else last.clients,
+            fingerprints=MappingProxyType(fingerprints),
+            timed_out=frozenset(timed_out),
+        )
+
+    async def async_refresh(self) -> None:
+        previous_success = self.last_update_success
+        await super().async_refresh()
+        if not previous_success and not self.last_update_success:
+            # DataUpdateCoordinator stays silent on consecutive failures,
+            # but the error or the breaker state may have changed; states
+            # that did not change are dropped by the StatePublisher
+            self.async_update_listeners()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Call listeners of changed sections (all of them after a failure)."""
+        changed, self._changed = self._changed, None
+        if changed is None or not self.last_update_success:
+            super().async_update_listeners()
+            return
+        self.async_notify(*changed)
+
+    @callback
+    def async_notify(self, *sections: str) -> None:
+        """Call the listeners depending on any of ``sections``."""
+        wanted = set(sections)
+        for update_callback, context in list(self._listeners.values()):
+            if context is None or wanted.intersection(context):
+                update_callback()
+
+    @callback
+    def async_set_top_n(self, top_n: int) -> None:
+        self.top_n = top_n
+        # Derived Entities sofort neu rechnen lassen (auch ohne 2-min Status refresh)
+        self.async_notify("WifiClients")
+
+    def _update_device_registry(self, fw_data, wls_data):
+        # Device Registry Update (MACs & versions)
+        try:
+            mac_24 = norm_mac((wls_data or {}).get("wireless_2g_macaddr"))
+            mac_5 = norm_mac((wls_data or {}).get("wireless_5g_macaddr"))
+            conn_set = {("mac", m) for m in (mac_24, mac_5) if m}
+
+            device_registry = dr.async_get(self.hass)
+            dev = device_registry.async_get_or_create(
+                config_entry_id=self._entry.entry_id,
+                identifiers={("tplink_wpa", self.ip)},
+                manufacturer="TP-Link",
+                name="TP-Link WPA",
+                connections=conn_set if conn_set else None,
+            )
+
+            device_registry.async_update_device(
+                device_id=dev.id,
+                model=(fw_data or {}).get("model") or "WPA",
+                sw_version=(fw_data or {}).get("firmware_version"),
+                hw_version=(fw_data or {}).get("hardware_version"),
+            )
+        except Exception as reg_err:
+            _LOGGER.debug("Device registry update skipped/failed: %s", reg_err)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .fleet import DATA_FLEET
+
+TO_REDACT = {"password", "wireless_2g_pwd", "wireless_5g_pwd"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Timings, errors and the last snapshot of one device."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    session = coordinator.session
+    fleet = hass.data.get(DATA_FLEET)
+    snapshot = coordinator.data
+
+    return {
+        "entry": async_redact_data({**entry.data, "options": dict(entry.options)}, TO_REDACT),
+        "last_update_success": coordinator.last_update_success,
+        "last_exception": str(coordinator.last_exception) if coordinator.last_exception else None,
+        "logged_in": session.logged_in,
+        "lease": session.lease_state,
+        "unsupported_endpoints": sorted(session.unsupported_endpoints),
+        "poll": fleet.stats(entry.entry_id) if fleet else {},
+        "breaker": coordinator.breaker.as_dict(),
+        "liveness": coordinator.liveness.as_dict(),
+        "state_writes": coordinator.publish_stats.as_dict(),
+        "timings": session.stats.as_dict(),
+        "status": async_redact_data(dict(snapshot.status), TO_REDACT) if snapshot else None,
+    }
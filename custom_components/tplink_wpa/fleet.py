@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import timedelta
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+from .const import DOMAIN, FLEET_MAX_CONCURRENT, SCAN_INTERVAL
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_FLEET = f"{DOMAIN}_fleet"
+
+
+class _Device:
+    __slots__ = (
+        "coordinator",
+        "phase",
+        "unsub",
+        "waiters",
+        "queued_at",
+        "queue_wait",
+        "latency",
+        "polls",
+    )
+
+    def __init__(self, coordinator, phase: float):
+        self.coordinator = coordinator
+        self.phase = phase
+        self.unsub: CALLBACK_TYPE | None = None
+        self.waiters: list[asyncio.Future] = []
+        self.queued_at: float | None = None
+        self.queue_wait: float | None = None
+        self.latency: float | None = None
+        self.polls = 0
+
+
+class FleetScheduler:
+    """Polls the coordinators of all config entries of the domain.
+
+    Each device gets a random phase within the scan interval so the polls
+    of many adapters do not all land on the same second; due devices are
+    queued FIFO (a device is never queued twice) and at most
+    ``max_concurrent`` polls run at the same time.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        interval: timedelta = SCAN_INTERVAL,
+        max_concurrent: int = FLEET_MAX_CONCURRENT,
+    ):
+        self._hass = hass
+        self._interval = interval
+        self._max_concurrent = max_concurrent
+        self._devices: dict[str, _Device] = {}
+        self._queue: deque[str] = deque()
+        self._running: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    @callback
+    def async_get(hass: HomeAssistant) -> FleetScheduler:
+        if DATA_FLEET not in hass.data:
+            hass.data[DATA_FLEET] = FleetScheduler(hass)
+        return hass.data[DATA_FLEET]
+
+    @callback
+    def async_add(self, key: str, coordinator) -> None:
+        """Register a device; its periodic polls start after its phase offset."""
+        device = _Device(coordinator, random.uniform(0, self._interval.total_seconds()))
+        self._devices[key] = device
+
+        @callback
+        def _start(_now) -> None:
+            device.unsub = async_track_time_interval(
+                self._hass, lambda _now: self._async_enqueue(key), self._interval
+            )
+            self._async_enqueue(key)
+
+        device.unsub = async_call_later(self._hass, device.phase, _start)
+
+    @callback
+    def async_remove(self, key: str) -> None:
+        device = self._devices.pop(key, None)
+        if device is None:
+            return
+        if device.unsub:
+            device.unsub()
+        if key in self._queue:
+            self._queue.remove(key)
+        if task := self._running.get(key):
+            task.cancel()
+        for waiter in device.waiters:
+            if not waiter.done():
+                waiter.cancel()
+        if not self._devices:
+            self._hass.data.pop(DATA_FLEET, None)
+
+    async def async_poll(self, key: str) -> None:
+        """Queue a poll of ``key`` right away and wait until it finished."""
+        waiter = self._hass.loop.create_future()
+        self._devices[key].waiters.append(waiter)
+        self._async_enqueue(key)
+        await waiter
+
+    @callback
+    def async_request_poll(self, key: str) -> None:
+        """Queue a poll of ``key`` right away without waiting for it."""
+        self._async_enqueue(key)
+
+    def stats(self, key: str) -> dict:
+        device = self._devices.get(key)
+        if device is None:
+            return {}
+        return {
+            "poll_latency": round(device.latency, 3) if device.latency is not None else None,
+            "poll_queue_wait": round(device.queue_wait, 3) if device.queue_wait is not None else None,
+            "polls": device.polls,
+            "phase": round(device.phase, 1),
+        }
+
+    @callback
+    def _async_enqueue(self, key: str) -> None:
+        device = self._devices.get(key)
+        if device is None or key in self._running or key in self._queue:
+            return
+        device.queued_at = time.monotonic()
+        self._queue.append(key)
+        self._async_pump()
+
+    @callback
+    def _async_pump(self) -> None:
+        while self._queue and len(self._running) < self._max_concurrent:
+            key = self._queue.popleft()
+            task = self._hass.async_create_background_task(
+                self._async_run(key), f"{DOMAIN} fleet poll {key}"
+            )
+            if not task.done():  # may have finished eagerly
+                self._running[key] = task
+
+    async def _async_run(self, key: str) -> None:
+        device = self._devices.get(key)
+        try:
+            if device is None:
+                return
+            start = time.monotonic()
+            device.queue_wait = start - device.queued_at
+            await device.coordinator.async_refresh()
+            device.latency = time.monotonic() - start
+            device.polls += 1
+            _LOGGER.debug(
+                "Polled %s in %.3fs (queued %.3fs)", key, device.latency, device.queue_wait
+            )
+        finally:
+            self._running.pop(key, None)
+            if device is not None:
+                waiters, device.waiters = device.waiters, []
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+            self._async_pump()
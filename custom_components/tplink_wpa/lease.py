@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+
+# lower goes first
+PRIORITY_WRITE = 0
+PRIORITY_POLL = 10
+
+
+class LeaseQueue:
+    """Exclusive lease on one device session, granted by priority.
+
+    Waiters with a lower priority value go first, FIFO within the same
+    priority.  A released lease goes straight to the next waiter, so the
+    logged-in session (and the lock file) are handed over instead of being
+    given up in between.
+    """
+
+    def __init__(self):
+        self._held = False
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int) -> bool:
+        """Wait for the lease; True if it was handed over by a previous holder."""
+        if not self._held and not self.waiting:
+            self._held = True
+            return False
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # granted while being cancelled, pass it on
+                self.release()
+            raise
+        return True
+
+    def release(self) -> bool:
+        """True if the lease went to a waiter."""
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():  # cancelled waiters are skipped
+                fut.set_result(None)
+                return True
+        self._held = False
+        return False
+
+    def as_dict(self) -> dict:
+        return {"held": self._held, "waiting": self.waiting}
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, LIVENESS_MISSES, LIVENESS_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LivenessMonitor:
+    """Unauthenticated ping of one device at a short interval.
+
+    One unencrypted request without login (see ``TL_WPA4220.ping``), so it
+    can run every few seconds and notices an adapter dropping off the LAN
+    long before the next poll.  ``misses`` pings in a row without answer
+    mark the device offline, the first answer marks it online again and
+    calls ``on_recovered``.  An interval of 0 disables the monitor.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        session,
+        interval: timedelta,
+        on_recovered: Callable[[], None],
+        misses: int = LIVENESS_MISSES,
+    ):
+        self._hass = hass
+        self._session = session
+        self._interval = interval
+        self._on_recovered = on_recovered
+        self._misses_allowed = max(1, misses)
+        self._listeners: list[CALLBACK_TYPE] = []
+        self._unsub: CALLBACK_TYPE | None = None
+        self._task: asyncio.Task | None = None
+        # None until the first ping decided it
+        self.online: bool | None = None
+        self.rtt: float | None = None
+        self.misses = 0
+        self.changed_at: datetime | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._interval.total_seconds() > 0
+
+    @property
+    def interval(self) -> timedelta:
+        return self._interval
+
+    @callback
+    def async_start(self) -> None:
+        if not self.enabled or self._unsub is not None:
+            return
+        self._unsub = async_track_time_interval(
+            self._hass, self._async_tick, self._interval
+        )
+        self._async_tick(None)
+
+    @callback
+    def async_stop(self) -> None:
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @callback
+    def async_set_interval(self, interval: timedelta) -> None:
+        if interval == self._interval:
+            return
+        self.async_stop()
+        self._interval = interval
+        if not self.enabled:
+            self.online = self.rtt = self.changed_at = None
+            self.misses = 0
+        self.async_start()
+        self._async_notify()
+
+    @callback
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        self._listeners.append(update_callback)
+
+        @callback
+        def _remove() -> None:
+            self._listeners.remove(update_callback)
+
+        return _remove
+
+    def as_dict(self) -> dict:
+        return {
+            "online": self.online,
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "misses": self.misses,
+            "interval": self._interval.total_seconds(),
+        }
+
+    @callback
+    def _async_tick(self, _now) -> None:
+        # a ping still waiting for its timeout is not overtaken by the next
+        if self._task is not None:
+            return
+        self._task = self._hass.async_create_background_task(
+            self._async_ping(), f"{DOMAIN} ping {self._session.ip}"
+        )
+        if self._task.done():  # may have finished eagerly
+            self._task = None
+
+    async def _async_ping(self) -> None:
+        timeout = min(LIVENESS_TIMEOUT, self._interval).total_seconds()
+        try:
+            rtt = await self._session.async_ping(timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            _LOGGER.debug("Ping of %s failed: %s", self._session.ip, err)
+            self._async_missed()
+        else:
+            self._async_answered(rtt)
+        finally:
+            # async_stop may already have started a new one
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    @callback
+    def _async_missed(self) -> None:
+        self.misses += 1
+        self.rtt = None
+        if self.misses >= self._misses_allowed and self.online is not False:
+            _LOGGER.info("%s stopped answering pings", self._session.ip)
+            self._async_set_online(False)
+        self._async_notify()
+
+    @callback
+    def _async_answered(self, rtt: float) -> None:
+        was_offline = self.online is False
+        self.misses = 0
+        self.rtt = rtt
+        if self.online is not True:
+            self._async_set_online(True)
+        self._async_notify()
+        if was_offline:
+            _LOGGER.info("%s answers pings again, polling it now", self._session.ip)
+            self._on_recovered()
+
+    @callback
+    def _async_set_online(self, online: bool) -> None:
+        self.online = online
+        self.changed_at = dt_util.utcnow()
+
+    @callback
+    def _async_notify(self) -> None:
+        for update_callback in list(self._listeners):
+            update_callback()
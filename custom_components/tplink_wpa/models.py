@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import heapq
+import re
+from dataclasses import dataclass
+
+_RATE_RE = re.compile(r"\d+")
+
+
+def norm_mac(mac: str | None) -> str | None:
+    if not mac:
+        return None
+    return mac.strip().lower().replace("-", ":")
+
+
+def as_list(maybe) -> list:
+    if isinstance(maybe, list):
+        return maybe
+    if isinstance(maybe, dict):
+        return [maybe]
+    return []
+
+
+def _rate(v) -> int | None:
+    if isinstance(v, (int, float)):
+        return int(v)
+    if isinstance(v, str):
+        m = _RATE_RE.search(v)
+        if m:
+            return int(m.group(0))
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class PlcPeer:
+    mac: str | None
+    rx: int | None
+    tx: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class PlcSnapshot:
+    """PlcDeviceStatus parsed once per refresh; PLC entities only read it."""
+
+    peers: tuple[PlcPeer, ...] = ()
+    macs: tuple[str, ...] = ()
+    max_rx: int | None = None
+    max_tx: int | None = None
+    min_rx: int | None = None
+    min_tx: int | None = None
+    worst: int | None = None
+
+    @classmethod
+    def from_status(cls, plc_status) -> PlcSnapshot:
+        peers = tuple(
+            PlcPeer(
+                mac=norm_mac(d.get("device_mac")),
+                rx=_rate(d.get("rx_rate")),
+                tx=_rate(d.get("tx_rate")),
+            )
+            for d in as_list(plc_status)
+            if isinstance(d, dict)
+        )
+        rx = [p.rx for p in peers if p.rx is not None]
+        tx = [p.tx for p in peers if p.tx is not None]
+        return cls(
+            peers=peers,
+            macs=tuple(sorted({p.mac for p in peers if p.mac})),
+            max_rx=max(rx) if rx else None,
+            max_tx=max(tx) if tx else None,
+            min_rx=min(rx) if rx else None,
+            min_tx=min(tx) if tx else None,
+            worst=min(rx + tx) if rx or tx else None,
+        )
+
+
+def _to_int(v) -> int:
+    if isinstance(v, (int, float)):
+        return int(v)
+    try:
+        return int(str(v).strip())
+    except Exception:
+        return 0
+
+
+def _bands(client_type) -> tuple[bool, bool]:
+    t = str(client_type or "").strip().lower()
+    is_24 = "2.4" in t
+    is_5 = ("5" in t) and ("ghz" in t or " 5g" in t or t.endswith("5g"))
+    return is_24, is_5
+
+
+@dataclass(frozen=True, slots=True)
+class WifiClient:
+    name: str | None
+    mac: str | None
+    ip: str | None
+    band: str | None
+    rx: int
+    tx: int
+    is_24: bool
+    is_5: bool
+
+    @property
+    def total_pkts(self) -> int:
+        return self.rx + self.tx
+
+    @property
+    def has_ip(self) -> bool:
+        return isinstance(self.ip, str) and self.ip.lower() != "unknown" and len(self.ip) > 0
+
+    def as_attr(self, with_band: bool = True) -> dict:
+        attr = {
+            "name": self.name,
+            "mac": self.mac,
+            "ip": self.ip,
+            "band": self.band,
+            "pkts": f"({self.rx/1000:.1f}k, {self.tx/1000:.1f}k)",
+        }
+        if not with_band:
+            del attr["band"]
+        return attr
+
+
+BANDS = (None, "2.4", "5")
+
+
+class ClientIndex:
+    """WifiClients indexed once per refresh and shared by all client sensors.
+
+    Clients are bucketed by band (``None`` = all bands) with the name lists
+    precomputed; top-N lists are built lazily with a partial selection and
+    cached per (band, n), so the total/2.4/5 GHz sensors never sort again.
+    """
+
+    __slots__ = ("by_mac", "_buckets", "_names", "with_ip", "_top")
+
+    def __init__(self, clients: list[WifiClient] = ()):
+        self.by_mac = {c.mac: c for c in clients if c.mac}
+        self._buckets = {
+            None: tuple(clients),
+            "2.4": tuple(c for c in clients if c.is_24),
+            "5": tuple(c for c in clients if c.is_5),
+        }
+        self._names = {
+            band: sorted(
+                {c.name.strip() for c in bucket if c.mac and isinstance(c.name, str) and c.name.strip()}
+            )
+            for band, bucket in self._buckets.items()
+        }
+        self.with_ip = sum(1 for c in clients if c.has_ip)
+        self._top: dict[tuple[str | None, int], list[dict]] = {}
+
+    @classmethod
+    def from_status(cls, wifi_clients) -> ClientIndex:
+        clients = []
+        for c in wifi_clients if isinstance(wifi_clients, list) else []:
+            if not isinstance(c, dict):
+                continue
+            mac = norm_mac(c.get("mac"))
+            is_24, is_5 = _bands(c.get("type"))
+            clients.append(
+                WifiClient(
+                    name=c.get("devName") or c.get("name") or mac,
+                    mac=mac,
+                    ip=c.get("ip"),
+                    band=c.get("type"),
+                    rx=_to_int(c.get("rxpkts")),
+                    tx=_to_int(c.get("txpkts")),
+                    is_24=is_24,
+                    is_5=is_5,
+                )
+            )
+        return cls(clients)
+
+    def count(self, band: str | None = None) -> int:
+        return len(self._buckets[band])
+
+    def names(self, band: str | None = None) -> list[str]:
+        return self._names[band]
+
+    def top(self, band: str | None, n: int) -> list[dict]:
+        """Top ``n`` clients of a band by rx+tx packets (same order as a stable sort)."""
+        if not isinstance(n, int) or n <= 0:
+            return []
+        key = (band, n)
+        if key not in self._top:
+            best = heapq.nlargest(n, self._buckets[band], key=lambda c: c.total_pkts)
+            self._top[key] = [c.as_attr(with_band=band is None) for c in best]
+        return self._top[key]
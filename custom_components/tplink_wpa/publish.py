@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+
+from homeassistant.core import callback
+
+
+class PublishStats:
+    """Written vs. suppressed state writes, shared by all entities of a device."""
+
+    __slots__ = ("written", "suppressed")
+
+    def __init__(self):
+        self.written = 0
+        self.suppressed = 0
+
+    def as_dict(self) -> dict:
+        return {"written": self.written, "suppressed": self.suppressed}
+
+
+def _strip(attrs: Mapping, paths: tuple[tuple[str, ...], ...]) -> dict:
+    """Copy of ``attrs`` without the (nested) keys in ``paths``."""
+    out = dict(attrs)
+    for path in paths:
+        node = out
+        for key in path[:-1]:
+            child = node.get(key)
+            if not isinstance(child, Mapping):
+                break
+            node[key] = node = dict(child)
+        else:
+            node.pop(path[-1], None)
+    return out
+
+
+class StatePublisher:
+    """Skip ``async_write_ha_state`` when state and attributes did not change.
+
+    Every written state ends up as a recorder row, so the entity's
+    availability, state and attributes are compared against the last
+    written ones first.  ``volatile`` lists attribute key paths (e.g.
+    ``("WlanStatus", "wireless_2g_pwd")``) that are published but ignored
+    in that comparison.
+    """
+
+    def __init__(self, stats: PublishStats, volatile: tuple[tuple[str, ...], ...] = ()):
+        self._stats = stats
+        self._volatile = volatile
+        self._last = None
+
+    def changed(self, available, state, attributes: Mapping | None) -> bool:
+        current = (available, state, _strip(attributes or {}, self._volatile))
+        if current == self._last:
+            self._stats.suppressed += 1
+            return False
+        self._last = current
+        self._stats.written += 1
+        return True
+
+    @callback
+    def async_write(self, entity) -> None:
+        if self.changed(entity.available, entity.state, entity.extra_state_attributes):
+            entity.async_write_ha_state()
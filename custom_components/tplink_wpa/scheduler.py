@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+
+class RefreshScheduler:
+    """Per-endpoint refresh schedule with a cache of the last fetched values.
+
+    Each section (``FirmwareInfo``, ``WlanStatus``, ...) has its own
+    interval; ``None`` means "every poll".  Sections can be invalidated on
+    demand (after a write or a new login) so they are fetched on the next
+    poll regardless of their interval.
+    """
+
+    def __init__(self, intervals: dict[str, timedelta | None]):
+        self._intervals = {
+            k: (v.total_seconds() if v is not None else None) for k, v in intervals.items()
+        }
+        self._fetched_at: dict[str, float] = {}
+        self._values: dict = {}
+
+    @property
+    def sections(self):
+        return list(self._intervals)
+
+    def due(self, now: float | None = None) -> list[str]:
+        """Sections that have to be fetched on this poll."""
+        now = time.monotonic() if now is None else now
+        out = []
+        for section, interval in self._intervals.items():
+            last = self._fetched_at.get(section)
+            if last is None or interval is None or now - last >= interval:
+                out.append(section)
+        return out
+
+    def store(self, section: str, value, now: float | None = None):
+        self._values[section] = value
+        self._fetched_at[section] = time.monotonic() if now is None else now
+
+    def invalidate(self, *sections: str):
+        """Force a refetch of the given sections (all if none given)."""
+        for section in sections or list(self._fetched_at):
+            self._fetched_at.pop(section, None)
+
+    def values(self) -> dict:
+        return {section: self._values.get(section) for section in self._intervals}
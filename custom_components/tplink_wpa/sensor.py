@@ -1,105 +1,151 @@
 from __future__ import annotations
 
-import asyncio
 import logging
-import re
-from datetime import datetime, timedelta
 
 from homeassistant.components.binary_sensor import (
     BinarySensorDeviceClass,
     BinarySensorEntity,
 )
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.const import UnitOfDataRate
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfDataRate, UnitOfTime
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.helpers import device_registry as dr
-from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN
-from .TL_WPA4220 import TL_WPA4220
+from .coordinator import (
+    DeviceUnreachable,
+    PollTimeout,
+    TPLinkCoordinator,
+    WpaSnapshot,
+    liveness_interval,
+)
+from .fleet import DATA_FLEET
+from .models import ClientIndex, PlcSnapshot
+from .publish import StatePublisher
 
 _LOGGER = logging.getLogger(__name__)
 
-SIGNAL_WPA4220_UPDATED = "tplink_wpa_updated_{ip}"
-SCAN_INTERVAL = timedelta(minutes=2)
-
 PLC_DEGRADED_THRESHOLD = 100  # Mbit/s
 
+_EMPTY = WpaSnapshot(status={})
+
+# published, but a change of these alone does not cause a state write
+_STATUS_VOLATILE = (
+    ("WlanStatus", "wireless_2g_pwd"),
+    ("WlanStatus", "wireless_5g_pwd"),
+    ("state_writes",),
+    ("state_writes_suppressed",),
+    ("poll",),
+)
+
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
     """Set up sensors for TP-Link WPA powerline device."""
     ip = config_entry.data["ip_address"]
-    pwd = config_entry.data["password"]
-
-    shared = {"status": None, "top_n": int((config_entry.options or {}).get("top_n", 12))}
+    coordinator: TPLinkCoordinator = hass.data[DOMAIN][config_entry.entry_id]
 
-    main = TPLinkStatusSensor(hass, "TP-Link WPA Status", ip, pwd, config_entry, shared)
+    main = TPLinkStatusSensor(coordinator, "TP-Link WPA Status", ip, config_entry)
 
     entities = [
         main,
-        WifiClientsTotalSensor(hass, "WLAN Clients (gesamt)", ip, config_entry, shared),
-        WifiClients24Sensor(hass, "WLAN Clients 2.4 GHz", ip, config_entry, shared),
-        WifiClients5Sensor(hass, "WLAN Clients 5 GHz", ip, config_entry, shared),
-        WifiClientsWithIpSensor(hass, "WLAN Clients mit IP", ip, config_entry, shared),
-        PlcPeersCountSensor(hass, "PLC Peers (Anzahl)", ip, config_entry, shared),
-        PlcMaxRxRateSensor(hass, "PLC Max RX (Mbit/s)", ip, config_entry, shared),
-        PlcMaxTxRateSensor(hass, "PLC Max TX (Mbit/s)", ip, config_entry, shared),
-        PlcMinRxRateSensor(hass, "PLC min RX (Mbit/s)", ip, config_entry, shared),
-        PlcMinTxRateSensor(hass, "PLC min TX (Mbit/s)", ip, config_entry, shared),
+        WifiClientsTotalSensor(coordinator, "WLAN Clients (gesamt)", ip, config_entry),
+        WifiClients24Sensor(coordinator, "WLAN Clients 2.4 GHz", ip, config_entry),
+        WifiClients5Sensor(coordinator, "WLAN Clients 5 GHz", ip, config_entry),
+        WifiClientsWithIpSensor(coordinator, "WLAN Clients mit IP", ip, config_entry),
+        PlcPeersCountSensor(coordinator, "PLC Peers (Anzahl)", ip, config_entry),
+        PlcMaxRxRateSensor(coordinator, "PLC Max RX (Mbit/s)", ip, config_entry),
+        PlcMaxTxRateSensor(coordinator, "PLC Max TX (Mbit/s)", ip, config_entry),
+        PlcMinRxRateSensor(coordinator, "PLC min RX (Mbit/s)", ip, config_entry),
+        PlcMinTxRateSensor(coordinator, "PLC min TX (Mbit/s)", ip, config_entry),
         PlcDegradedBinary(
-            hass,
+            coordinator,
             f"PLC unter {PLC_DEGRADED_THRESHOLD} Mbit/s?",
             ip,
             config_entry,
-            shared,
         ),
-        WifiSsid24Sensor(hass, "SSID 2.4 GHz", ip, config_entry, shared),
-        WifiSsid5Sensor(hass, "SSID 5 GHz", ip, config_entry, shared),
-        WifiChannel24Sensor(hass, "Kanal 2.4 GHz", ip, config_entry, shared),
-        WifiChannel5Sensor(hass, "Kanal 5 GHz", ip, config_entry, shared),
-        Wifi24EnabledBinary(hass, "WLAN 2.4 GHz aktiv", ip, config_entry, shared),
-        Wifi5EnabledBinary(hass, "WLAN 5 GHz aktiv", ip, config_entry, shared),
+        WifiSsid24Sensor(coordinator, "SSID 2.4 GHz", ip, config_entry),
+        WifiSsid5Sensor(coordinator, "SSID 5 GHz", ip, config_entry),
+        WifiChannel24Sensor(coordinator, "Kanal 2.4 GHz", ip, config_entry),
+        WifiChannel5Sensor(coordinator, "Kanal 5 GHz", ip, config_entry),
+        Wifi24EnabledBinary(coordinator, "WLAN 2.4 GHz aktiv", ip, config_entry),
+        Wifi5EnabledBinary(coordinator, "WLAN 5 GHz aktiv", ip, config_entry),
+        PollDurationSensor(coordinator, "Poll Dauer p95", ip, config_entry),
+        LoginDurationSensor(coordinator, "Login Dauer", ip, config_entry),
+        RequestErrorRateSensor(coordinator, "Fehlerrate Requests", ip, config_entry),
+        ReachableBinary(coordinator, "Erreichbar", ip, config_entry),
+        PingRttSensor(coordinator, "Ping RTT", ip, config_entry),
     ]
 
-    async_add_entities(entities, update_before_add=True)
+    async_add_entities(entities)
 
     # ---- Options wirken SOFORT: update listener ----
-    @callback
-    def _options_updated(_hass: HomeAssistant, entry) -> None:
-        shared["top_n"] = int((entry.options or {}).get("top_n", 12))
-        # Derived Entities sofort neu rechnen lassen (auch ohne 2-min Status refresh)
-        async_dispatcher_send(hass, SIGNAL_WPA4220_UPDATED.format(ip=ip))
+    # update listeners are awaited by HA, so this has to be a coroutine
+    async def _options_updated(_hass: HomeAssistant, entry) -> None:
+        coordinator.async_set_top_n(int((entry.options or {}).get("top_n", 12)))
+        coordinator.liveness.async_set_interval(liveness_interval(entry.options))
 
     config_entry.async_on_unload(config_entry.add_update_listener(_options_updated))
 
 
-class TPLinkStatusSensor(SensorEntity):
-    """Sensor to retrieve the full status of the device."""
+class TPLinkStatusSensor(CoordinatorEntity[TPLinkCoordinator], SensorEntity):
+    """Sensor exposing the full status of the device."""
 
-    _attr_should_poll = True
     _attr_icon = "mdi:access-point"
 
-    def __init__(self, hass, name, ip, password, config_entry, shared):
+    def __init__(self, coordinator, name, ip, config_entry):
+        # context None: notified on every refresh
+        super().__init__(coordinator)
         self._ip = ip
         self._name = name
-        self._state = None
-        self._attributes = {}
-        self._hass = hass
-        self._password = password
         self._config_entry = config_entry
-        self._shared = shared
+        self._publisher = StatePublisher(coordinator.publish_stats, volatile=_STATUS_VOLATILE)
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def available(self):
+        return True
+
     @property
     def state(self):
-        return self._state
+        if not self.coordinator.last_update_success:
+            if isinstance(self.coordinator.last_exception, PollTimeout):
+                return "timeout"
+            if isinstance(self.coordinator.last_exception, DeviceUnreachable):
+                return "unreachable"
+            return "error"
+        return "connected" if self.coordinator.data else None
 
     @property
     def extra_state_attributes(self):
-        return self._attributes
+        if not self.coordinator.last_update_success:
+            attrs = {"error": str(self.coordinator.last_exception)}
+        else:
+            attrs = dict(self.coordinator.data.status) if self.coordinator.data else {}
+            if self.coordinator.data and self.coordinator.data.timed_out:
+                attrs["timed_out"] = sorted(self.coordinator.data.timed_out)
+        stats = self.coordinator.publish_stats
+        attrs["state_writes"] = stats.written
+        attrs["state_writes_suppressed"] = stats.suppressed
+        fleet = self.hass.data.get(DATA_FLEET)
+        attrs["poll"] = fleet.stats(self._config_entry.entry_id) if fleet else {}
+        attrs["breaker"] = self.coordinator.breaker.as_dict()
+        return attrs
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # the platform writes the initial state right after this
+        self._publisher.changed(self.available, self.state, self.extra_state_attributes)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._publisher.async_write(self)
 
     @property
     def unique_id(self):
@@ -115,95 +161,32 @@ class TPLinkStatusSensor(SensorEntity):
             "configuration_url": f"http://{self._ip}/",
         }
 
-    async def async_update(self):
-        device = None
-        try:
-            device = TL_WPA4220(self._ip)
-            _LOGGER.debug("Logging in to the device... %s", self._ip)
-            await self._hass.async_add_executor_job(device.login, self._password)
-
-            fw_data, plc_list, wls_data, wic_list = await asyncio.gather(
-                self._hass.async_add_executor_job(device.get_firmware_info),
-                self._hass.async_add_executor_job(device.get_plc_device_status),
-                self._hass.async_add_executor_job(device.get_wlan_status),
-                self._hass.async_add_executor_job(device.get_wifi_clients),
-            )
-
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            if isinstance(wls_data, dict):
-                wls_data["wireless_2g_pwd"] = f"hidden ({now_str})"
-                wls_data["wireless_5g_pwd"] = f"hidden ({now_str})"
-
-        except Exception as e:
-            self._state = "error"
-            self._attributes = {"error": str(e)}
-            _LOGGER.error("Error during data retrieval: %s", e)
-        else:
-            status = {
-                "FirmwareInfo": fw_data,
-                "WlanStatus": wls_data,
-                "WifiClients": wic_list,
-                "PlcDeviceStatus": plc_list,
-            }
-            self._state = "connected"
-            self._attributes = status
-            self._shared["status"] = status
-
-            async_dispatcher_send(self._hass, SIGNAL_WPA4220_UPDATED.format(ip=self._ip))
-
-            # Device Registry Update (MACs & versions)
-            try:
-                def _norm(mac):
-                    if not mac:
-                        return None
-                    return mac.strip().lower().replace("-", ":")
-
-                mac_24 = _norm((wls_data or {}).get("wireless_2g_macaddr"))
-                mac_5 = _norm((wls_data or {}).get("wireless_5g_macaddr"))
-                conn_set = {("mac", m) for m in (mac_24, mac_5) if m}
-
-                device_registry = dr.async_get(self._hass)
-                dev = device_registry.async_get_or_create(
-                    config_entry_id=self._config_entry.entry_id,
-                    identifiers={("tplink_wpa", self._ip)},
-                    manufacturer="TP-Link",
-                    name="TP-Link WPA",
-                    connections=conn_set if conn_set else None,
-                )
-
-                device_registry.async_update_device(
-                    device_id=dev.id,
-                    model=(fw_data or {}).get("model") or "WPA",
-                    sw_version=(fw_data or {}).get("firmware_version"),
-                    hw_version=(fw_data or {}).get("hardware_version"),
-                )
-            except Exception as reg_err:
-                _LOGGER.debug("Device registry update skipped/failed: %s", reg_err)
-
-        finally:
-            try:
-                if device:
-                    await self._hass.async_add_executor_job(device.logout)
-            except Exception as logout_error:
-                _LOGGER.error("Logout error: %s", logout_error)
-
-
-class _DerivedBinaryBase(BinarySensorEntity):
-    _attr_should_poll = False
-
-    def __init__(self, hass, name, ip, config_entry, shared):
-        self._hass = hass
+
+class _DerivedEntity(CoordinatorEntity[TPLinkCoordinator]):
+    """Entity computed from one or more sections of the coordinator snapshot.
+
+    Subclasses list the sections they read in ``_sections`` and are only
+    recomputed when one of them changed.
+    """
+
+    _sections: tuple[str, ...] = ()
+
+    def __init__(self, coordinator, name, ip, config_entry):
+        super().__init__(coordinator, context=self._sections)
         self._name = name
         self._ip = ip
         self._config_entry = config_entry
-        self._shared = shared
-        self._is_on = None
-        self._unsub = None
+        self._publisher = StatePublisher(coordinator.publish_stats)
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def available(self):
+        # keep showing the last values while the device is unreachable
+        return self.coordinator.data is not None
+
     @property
     def unique_id(self):
         return f"{self._config_entry.entry_id}_{self._ip}_{self.__class__.__name__.lower()}"
@@ -218,59 +201,53 @@ class _DerivedBinaryBase(BinarySensorEntity):
         }
 
     @property
-    def is_on(self):
-        return self._is_on
+    def _snapshot(self) -> WpaSnapshot:
+        return self.coordinator.data or _EMPTY
 
-    @callback
-    def _handle_push(self) -> None:
-        self.schedule_update_ha_state(True)
+    @property
+    def _plc(self) -> PlcSnapshot:
+        return self._snapshot.plc
+
+    @property
+    def _clients(self) -> ClientIndex:
+        return self._snapshot.clients
 
     async def async_added_to_hass(self) -> None:
-        self._unsub = async_dispatcher_connect(
-            self.hass,
-            SIGNAL_WPA4220_UPDATED.format(ip=self._ip),
-            self._handle_push,
-        )
-        self.async_on_remove(self._unsub)
-        self.async_schedule_update_ha_state(True)
+        await super().async_added_to_hass()
+        self._recompute()
+        # the platform writes the initial state right after this
+        self._publisher.changed(self.available, self.state, self.extra_state_attributes)
 
-    async def async_update(self):
-        status = self._shared.get("status") or {}
-        self._compute_on(status)
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._recompute()
+        self._publisher.async_write(self)
 
-    def _compute_on(self, status: dict):
+    def _recompute(self) -> None:
         raise NotImplementedError
 
 
-class _DerivedBase(SensorEntity):
-    _attr_should_poll = False
-
-    def __init__(self, hass, name, ip, config_entry, shared):
-        self._hass = hass
-        self._name = name
-        self._ip = ip
-        self._config_entry = config_entry
-        self._shared = shared
-        self._state = None
-        self._unsub = None
-        self._attrs = {}
+class _DerivedBinaryBase(_DerivedEntity, BinarySensorEntity):
+    def __init__(self, coordinator, name, ip, config_entry):
+        super().__init__(coordinator, name, ip, config_entry)
+        self._is_on = None
 
     @property
-    def name(self):
-        return self._name
+    def is_on(self):
+        return self._is_on
 
-    @property
-    def unique_id(self):
-        return f"{self._config_entry.entry_id}_{self._ip}_{self.__class__.__name__.lower()}"
+    def _recompute(self) -> None:
+        self._compute_on(self._snapshot.status)
+
+    def _compute_on(self, status):
+        raise NotImplementedError
 
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {("tplink_wpa", self._ip)},
-            "name": "TP-Link WPA",
-            "manufacturer": "TP-Link",
-            "model": "WPA",
-        }
+
+class _DerivedBase(_DerivedEntity, SensorEntity):
+    def __init__(self, coordinator, name, ip, config_entry):
+        super().__init__(coordinator, name, ip, config_entry)
+        self._state = None
+        self._attrs = {}
 
     @property
     def extra_state_attributes(self):
@@ -280,209 +257,100 @@ class _DerivedBase(SensorEntity):
     def native_value(self):
         return self._state
 
-    @callback
-    def _handle_push(self) -> None:
-        self.schedule_update_ha_state(True)
-
-    async def async_update(self):
-        status = self._shared.get("status") or {}
-        self._compute_state(status)
+    def _recompute(self) -> None:
+        self._compute_state(self._snapshot.status)
 
-    async def async_added_to_hass(self) -> None:
-        self._unsub = async_dispatcher_connect(
-            self.hass,
-            SIGNAL_WPA4220_UPDATED.format(ip=self._ip),
-            self._handle_push,
-        )
-        self.async_on_remove(self._unsub)
-        self.async_schedule_update_ha_state(True)
-
-    # ---- Helpers ----
-    @staticmethod
-    def _as_list(maybe):
-        if isinstance(maybe, list):
-            return maybe
-        if isinstance(maybe, dict):
-            return [maybe]
-        return []
-
-    @staticmethod
-    def _unique_sorted(seq):
-        return sorted({x for x in seq if x})
-
-    @staticmethod
-    def _norm_mac(mac: str | None) -> str | None:
-        if not mac:
-            return None
-        return mac.strip().lower().replace("-", ":")
-
-    @staticmethod
-    def _to_int(v):
-        if isinstance(v, (int, float)):
-            return int(v)
-        try:
-            return int(str(v).strip())
-        except Exception:
-            return 0
-
-    @staticmethod
-    def _band_str(c) -> str:
-        return str((c or {}).get("type", "")).strip().lower()
-
-    def _is_band(self, client: dict, band: str | None) -> bool:
-        t = self._band_str(client)
-        if band is None:
-            return True
-        if band == "2.4":
-            return "2.4" in t
-        if band == "5":
-            return ("5" in t) and ("ghz" in t or " 5g" in t or t.endswith("5g"))
-        return False
-
-    def _clients_for(self, status: dict, band: str | None):
-        clients = status.get("WifiClients")
-        clients = clients if isinstance(clients, list) else []
-        return [c for c in clients if isinstance(c, dict) and self._is_band(c, band)]
-
-    def _take_top_n(self, items, n: int):
-        if not isinstance(items, list) or not isinstance(n, int) or n <= 0:
-            return []
-        return items[:n]
-
-    def _drop_key_from_dicts(self, items, key: str):
-        if not isinstance(items, list):
-            return []
-        out = []
-        for d in items:
-            if isinstance(d, dict):
-                out.append({k: v for k, v in d.items() if k != key})
-        return out
-
-    def _enrich_clients(self, clients: list[dict], top_n: int = 12):
-        names, macs, enriched = [], [], []
-        for c in clients:
-            mac = self._norm_mac(c.get("mac"))
-            name = (c.get("devName") or c.get("name") or mac)
-            rx = self._to_int(c.get("rxpkts"))
-            tx = self._to_int(c.get("txpkts"))
-            enriched.append(
-                {
-                    "name": name,
-                    "mac": mac,
-                    "ip": c.get("ip"),
-                    "band": c.get("type"),
-                    "pkts": f"({rx/1000:.1f}k, {tx/1000:.1f}k)",
-                    "total_pkts": rx + tx,
-                }
-            )
-            if mac:
-                if isinstance(name, str) and name.strip():
-                    names.append(name.strip())
-                macs.append(mac)
-
-        names_sorted = sorted(set(names))
-        macs_sorted_unique = self._unique_sorted(macs)
-
-        top_all = sorted(enriched, key=lambda x: x["total_pkts"], reverse=True)
-        top_n_list = self._take_top_n(top_all, top_n)
-        top_sorted = self._drop_key_from_dicts(top_n_list, "total_pkts")
-
-        return names_sorted, macs_sorted_unique, top_sorted
-
-    def _count_set_attr(self, attr_key: str, values_iterable):
-        vals = self._unique_sorted(values_iterable)
-        self._attrs[attr_key] = vals
-        self._state = len(vals)
-
-    def _compute_state(self, status: dict):
+    def _compute_state(self, status):
         raise NotImplementedError
 
 
 class WifiClientsTotalSensor(_DerivedBase):
+    _sections = ("WifiClients",)
+
     @property
     def icon(self):
         return "mdi:account-multiple"
 
     def _compute_state(self, status):
-        clients = self._clients_for(status, None)
-        self._state = len(clients)
+        index = self._clients
+        self._state = index.count(None)
 
-        n = int(self._shared.get("top_n", 12))
-        names, macs, topN = self._enrich_clients(clients, top_n=n)
+        n = int(self.coordinator.top_n)
         self._attrs.update(
             {
-                "wifi_client_names": names,
-                f"wifi_top{n}_by_packets": topN,
+                "wifi_client_names": index.names(None),
+                f"wifi_top{n}_by_packets": index.top(None, n),
             }
         )
 
 
 class WifiClients24Sensor(_DerivedBase):
+    _sections = ("WifiClients",)
+
     @property
     def icon(self):
         return "mdi:wifi"
 
     def _compute_state(self, status):
-        clients = self._clients_for(status, "2.4")
-        self._state = len(clients)
+        index = self._clients
+        self._state = index.count("2.4")
 
-        n = int(self._shared.get("top_n", 12))
-        names, macs, topN = self._enrich_clients(clients, top_n=n)
+        n = int(self.coordinator.top_n)
         self._attrs.update(
             {
-                "wifi_24_client_names": names,
-                f"wifi_24_top{n}_by_packets": self._drop_key_from_dicts(topN, "band"),
+                "wifi_24_client_names": index.names("2.4"),
+                f"wifi_24_top{n}_by_packets": index.top("2.4", n),
             }
         )
 
 
 class WifiClients5Sensor(_DerivedBase):
+    _sections = ("WifiClients",)
+
     @property
     def icon(self):
         return "mdi:wifi"
 
     def _compute_state(self, status):
-        clients = self._clients_for(status, "5")
-        self._state = len(clients)
+        index = self._clients
+        self._state = index.count("5")
 
-        n = int(self._shared.get("top_n", 12))
-        names, macs, topN = self._enrich_clients(clients, top_n=n)
+        n = int(self.coordinator.top_n)
         self._attrs.update(
             {
-                "wifi_5_client_names": names,
-                f"wifi_5_top{n}_by_packets": self._drop_key_from_dicts(topN, "band"),
+                "wifi_5_client_names": index.names("5"),
+                f"wifi_5_top{n}_by_packets": index.top("5", n),
             }
         )
 
 
 class WifiClientsWithIpSensor(_DerivedBase):
+    _sections = ("WifiClients",)
+
     @property
     def icon(self):
         return "mdi:lan-connect"
 
     def _compute_state(self, status):
-        clients = status.get("WifiClients")
-        clients = clients if isinstance(clients, list) else []
-
-        def has_ip(c):
-            ip = (c or {}).get("ip")
-            return isinstance(ip, str) and ip.lower() != "unknown" and len(ip) > 0
-
-        self._state = sum(1 for c in clients if isinstance(c, dict) and has_ip(c))
+        self._state = self._clients.with_ip
 
 
 class PlcPeersCountSensor(_DerivedBase):
+    _sections = ("PlcDeviceStatus",)
+
     @property
     def icon(self):
         return "mdi:power-plug"
 
     def _compute_state(self, status):
-        plc_items = self._as_list(status.get("PlcDeviceStatus"))
-        macs = (self._norm_mac((d or {}).get("device_mac")) for d in plc_items)
-        self._count_set_attr("plc_peers_macs", macs)
+        macs = self._plc.macs
+        self._attrs["plc_peers_macs"] = list(macs)
+        self._state = len(macs)
 
 
 class PlcMaxRxRateSensor(_DerivedBase):
+    _sections = ("PlcDeviceStatus",)
+
     @property
     def native_unit_of_measurement(self):
         return UnitOfDataRate.MEGABITS_PER_SECOND
@@ -492,21 +360,12 @@ class PlcMaxRxRateSensor(_DerivedBase):
         return "mdi:power-plug"
 
     def _compute_state(self, status):
-        plc = status.get("PlcDeviceStatus")
-        plc = [plc] if isinstance(plc, dict) else (plc if isinstance(plc, list) else [])
-        rx_vals = []
-        for d in plc:
-            v = (d or {}).get("rx_rate")
-            if isinstance(v, (int, float)):
-                rx_vals.append(int(v))
-            elif isinstance(v, str):
-                m = re.search(r"\d+", v)
-                if m:
-                    rx_vals.append(int(m.group(0)))
-        self._state = max(rx_vals) if rx_vals else None
+        self._state = self._plc.max_rx
 
 
 class PlcMaxTxRateSensor(_DerivedBase):
+    _sections = ("PlcDeviceStatus",)
+
     @property
     def native_unit_of_measurement(self):
         return UnitOfDataRate.MEGABITS_PER_SECOND
@@ -516,21 +375,12 @@ class PlcMaxTxRateSensor(_DerivedBase):
         return "mdi:power-plug"
 
     def _compute_state(self, status):
-        plc = status.get("PlcDeviceStatus")
-        plc = [plc] if isinstance(plc, dict) else (plc if isinstance(plc, list) else [])
-        tx_vals = []
-        for d in plc:
-            v = (d or {}).get("tx_rate")
-            if isinstance(v, (int, float)):
-                tx_vals.append(int(v))
-            elif isinstance(v, str):
-                m = re.search(r"\d+", v)
-                if m:
-                    tx_vals.append(int(m.group(0)))
-        self._state = max(tx_vals) if tx_vals else None
+        self._state = self._plc.max_tx
 
 
 class PlcMinRxRateSensor(_DerivedBase):
+    _sections = ("PlcDeviceStatus",)
+
     @property
     def native_unit_of_measurement(self):
         return UnitOfDataRate.MEGABITS_PER_SECOND
@@ -540,21 +390,12 @@ class PlcMinRxRateSensor(_DerivedBase):
         return "mdi:power-plug"
 
     def _compute_state(self, status):
-        plc = status.get("PlcDeviceStatus")
-        plc = [plc] if isinstance(plc, dict) else (plc if isinstance(plc, list) else [])
-        vals = []
-        for d in plc:
-            v = (d or {}).get("rx_rate")
-            if isinstance(v, (int, float)):
-                vals.append(int(v))
-            elif isinstance(v, str):
-                m = re.search(r"\d+", v)
-                if m:
-                    vals.append(int(m.group(0)))
-        self._state = min(vals) if vals else None
+        self._state = self._plc.min_rx
 
 
 class PlcMinTxRateSensor(_DerivedBase):
+    _sections = ("PlcDeviceStatus",)
+
     @property
     def native_unit_of_measurement(self):
         return UnitOfDataRate.MEGABITS_PER_SECOND
@@ -564,45 +405,24 @@ class PlcMinTxRateSensor(_DerivedBase):
         return "mdi:power-plug"
 
     def _compute_state(self, status):
-        plc = status.get("PlcDeviceStatus")
-        plc = [plc] if isinstance(plc, dict) else (plc if isinstance(plc, list) else [])
-        vals = []
-        for d in plc:
-            v = (d or {}).get("tx_rate")
-            if isinstance(v, (int, float)):
-                vals.append(int(v))
-            elif isinstance(v, str):
-                m = re.search(r"\d+", v)
-                if m:
-                    vals.append(int(m.group(0)))
-        self._state = min(vals) if vals else None
+        self._state = self._plc.min_tx
 
 
 class PlcDegradedBinary(_DerivedBinaryBase):
+    _sections = ("PlcDeviceStatus",)
+
     @property
     def device_class(self):
         return BinarySensorDeviceClass.PROBLEM
 
     def _compute_on(self, status):
-        plc = status.get("PlcDeviceStatus")
-        plc = [plc] if isinstance(plc, dict) else (plc if isinstance(plc, list) else [])
-        worst = None
-        for d in plc:
-            for key in ("rx_rate", "tx_rate"):
-                v = (d or {}).get(key)
-                if isinstance(v, (int, float)):
-                    val = int(v)
-                elif isinstance(v, str):
-                    m = re.search(r"\d+", v)
-                    val = int(m.group(0)) if m else None
-                else:
-                    val = None
-                if val is not None:
-                    worst = val if worst is None else min(worst, val)
+        worst = self._plc.worst
         self._is_on = worst is not None and worst < PLC_DEGRADED_THRESHOLD
 
 
 class WifiSsid24Sensor(_DerivedBase):
+    _sections = ("WlanStatus",)
+
     @property
     def icon(self):
         return "mdi:wifi"
@@ -613,6 +433,8 @@ class WifiSsid24Sensor(_DerivedBase):
 
 
 class WifiSsid5Sensor(_DerivedBase):
+    _sections = ("WlanStatus",)
+
     @property
     def icon(self):
         return "mdi:wifi"
@@ -623,6 +445,8 @@ class WifiSsid5Sensor(_DerivedBase):
 
 
 class WifiChannel24Sensor(_DerivedBase):
+    _sections = ("WlanStatus",)
+
     @property
     def icon(self):
         return "mdi:wifi-settings"
@@ -633,6 +457,8 @@ class WifiChannel24Sensor(_DerivedBase):
 
 
 class WifiChannel5Sensor(_DerivedBase):
+    _sections = ("WlanStatus",)
+
     @property
     def icon(self):
         return "mdi:wifi-settings"
@@ -643,6 +469,8 @@ class WifiChannel5Sensor(_DerivedBase):
 
 
 class Wifi24EnabledBinary(_DerivedBinaryBase):
+    _sections = ("WlanStatus",)
+
     @property
     def device_class(self):
         return BinarySensorDeviceClass.CONNECTIVITY
@@ -653,6 +481,8 @@ class Wifi24EnabledBinary(_DerivedBinaryBase):
 
 
 class Wifi5EnabledBinary(_DerivedBinaryBase):
+    _sections = ("WlanStatus",)
+
     @property
     def device_class(self):
         return BinarySensorDeviceClass.CONNECTIVITY
@@ -661,3 +491,126 @@ class Wifi5EnabledBinary(_DerivedBinaryBase):
         wls = status.get("WlanStatus") or {}
         self._is_on = str(wls.get("wireless_5g_enable", "")).lower() == "on"
 
+
+class _DiagnosticBase(_DerivedBase):
+    """Timings/errors of the client (see RequestStats in TL_WPA4220.py)."""
+
+    _sections = None  # every refresh
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    @property
+    def available(self):
+        # most interesting while the device misbehaves
+        return True
+
+    def _recompute(self) -> None:
+        self._compute_stats(self.coordinator.session.stats)
+
+    def _compute_stats(self, stats):
+        raise NotImplementedError
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class PollDurationSensor(_DiagnosticBase):
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = "mdi:timer-outline"
+
+    def _compute_stats(self, stats):
+        self._state = _ms(stats.percentile("poll", 95))
+        self._attrs["p50"] = _ms(stats.percentile("poll", 50))
+        self._attrs["last"] = _ms(stats.last("poll"))
+        self._attrs["lease_wait_p95"] = _ms(stats.percentile("lease", 95, "wait"))
+
+
+class LoginDurationSensor(_DiagnosticBase):
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = "mdi:login"
+
+    def _compute_stats(self, stats):
+        self._state = _ms(stats.last("login"))
+        self._attrs["p95"] = _ms(stats.percentile("login", 95))
+        self._attrs["rsa_key_p95"] = _ms(stats.percentile("login?form=auth", 95))
+
+
+class RequestErrorRateSensor(_DiagnosticBase):
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_icon = "mdi:alert-circle-outline"
+
+    def _compute_stats(self, stats):
+        # failed pings are what ReachableBinary shows
+        rate = stats.error_rate(exclude=("poll", "login", "ping"))
+        self._state = round(rate * 100, 1) if rate is not None else None
+
+
+class _LivenessEntity(_DerivedEntity):
+    """Fed by the LivenessMonitor instead of the polls (see liveness.py)."""
+
+    _sections = ()
+
+    @property
+    def _liveness(self):
+        return self.coordinator.liveness
+
+    @property
+    def available(self):
+        return self._liveness.enabled and self._liveness.online is not None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self._liveness.async_add_listener(self._handle_coordinator_update)
+        )
+
+
+class ReachableBinary(_LivenessEntity, BinarySensorEntity):
+    _attr_device_class = BinarySensorDeviceClass.CONNECTIVITY
+
+    def __init__(self, coordinator, name, ip, config_entry):
+        super().__init__(coordinator, name, ip, config_entry)
+        self._is_on = None
+        self._attrs = {}
+
+    @property
+    def is_on(self):
+        return self._is_on
+
+    @property
+    def extra_state_attributes(self):
+        return self._attrs
+
+    def _recompute(self) -> None:
+        liveness = self._liveness
+        self._is_on = liveness.online
+        self._attrs = {
+            "since": liveness.changed_at.isoformat() if liveness.changed_at else None,
+            "interval": liveness.interval.total_seconds(),
+        }
+
+
+class PingRttSensor(_LivenessEntity, SensorEntity):
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:lan-pending"
+
+    def __init__(self, coordinator, name, ip, config_entry):
+        super().__init__(coordinator, name, ip, config_entry)
+        self._state = None
+
+    @property
+    def native_value(self):
+        return self._state
+
+    def _recompute(self) -> None:
+        # whole ms, sub-ms jitter would write a new state on every ping
+        rtt = self._liveness.rtt
+        self._state = round(rtt * 1000) if rtt is not None else None
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from aiohttp import ClientResponseError
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .capabilities import CapabilityStore
+from .const import DOMAIN, REFRESH_INTERVALS
+from .lease import PRIORITY_POLL, PRIORITY_WRITE, LeaseQueue
+from .scheduler import RefreshScheduler
+from .TL_WPA4220 import TL_WPA4220, DeviceLock, RequestStats
+from .TL_WPA4220_async import AsyncTL_WPA4220
+
+_LOGGER = logging.getLogger(__name__)
+
+# session managers whose lease the current task (and the tasks it gathers)
+# holds, nested calls do not queue again
+_LEASED: ContextVar[frozenset] = ContextVar("tplink_wpa_leased", default=frozenset())
+
+LOCK_POLL_INTERVAL = 0.2  # seconds
+# how often an idle session looks for another process waiting for the device
+LOCK_WATCH_INTERVAL = 1.0  # seconds
+
+
+def _session_rejected(err: Exception) -> bool:
+    """True if the device no longer accepts our session (expired, or
+    another admin logged in); anything else is not cured by a new login."""
+    if isinstance(err, TL_WPA4220.TpError):
+        return err.error_code == "timeout"
+    return isinstance(err, ClientResponseError) and err.status == 403
+
+
+class TPLinkSessionManager:
+    """Keep one logged-in client per device and reuse it across polls.
+
+    The RSA handshake of ``login()`` is more expensive than the reads it
+    wraps and blocks the web UI for other admins, so the session stays open
+    until the device rejects it (then we log in again once) or the config
+    entry is unloaded.
+
+    Polls and writes take turns on that session through a lease (see
+    lease.py), and together with the CLI on the same host through a lock
+    file (``DeviceLock``).  The lock file is held as long as the session is
+    logged in and only given up (after a logout) for another process.
+    """
+
+    def __init__(self, hass: HomeAssistant, ip: str, password: str):
+        self._hass = hass
+        self._ip = ip
+        self._password = password
+        self._device = None
+        # bumped on every (re-)login so parallel callers that failed on the
+        # same dead session trigger only one re-login
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._leases = LeaseQueue()
+        self._file_lock = DeviceLock(ip)
+        self._lock_watch: asyncio.Task | None = None
+        self.schedule = RefreshScheduler(REFRESH_INTERVALS)
+        # request/login timings, kept across re-logins
+        self.stats = RequestStats()
+        # model/firmware key and unsupported endpoints (see capabilities.py)
+        self._capability_key: str | None = None
+        self._unsupported: list[str] = []
+        self._deadline: float | None = None
+
+    @property
+    def ip(self):
+        return self._ip
+
+    @property
+    def unsupported_endpoints(self) -> tuple[str, ...]:
+        return tuple(self._unsupported)
+
+    @property
+    def logged_in(self):
+        return self._device is not None and self._device.logged_in()
+
+    @contextmanager
+    def deadline(self, budget: float):
+        """All requests inside the block share a budget of ``budget`` seconds."""
+        self._set_deadline(time.monotonic() + budget)
+        try:
+            yield
+        finally:
+            self._set_deadline(None)
+
+    def _set_deadline(self, deadline: float | None) -> None:
+        self._deadline = deadline
+        if self._device is not None:
+            self._device.set_deadline(deadline)
+
+    @asynccontextmanager
+    async def lease(self, priority: int = PRIORITY_POLL):
+        """Exclusive use of the session for the block (reentrant)."""
+        leased = _LEASED.get()
+        if self in leased:
+            yield
+            return
+        start = time.perf_counter()
+        await self._leases.acquire(priority)
+        token = _LEASED.set(leased | {self})
+        try:
+            if not self._file_lock.locked:
+                await self._async_acquire_file_lock()
+            self.stats.add("lease", "wait", time.perf_counter() - start)
+            yield
+        finally:
+            _LEASED.reset(token)
+            try:
+                if not self._leases.waiting:
+                    await self._async_release_file_lock()
+            finally:
+                self._leases.release()
+
+    @property
+    def lease_state(self) -> dict:
+        return {**self._leases.as_dict(), "lock_file": self._file_lock.locked}
+
+    async def _async_acquire_file_lock(self) -> None:
+        with self._file_lock.waiting():
+            while not self._file_lock.try_acquire():
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+    async def _async_release_file_lock(self) -> None:
+        """End of a lease: keep the lock file while the session lives.
+
+        Given up after a logout if another process waits, or if there is no
+        session (anymore) to protect.
+        """
+        release = True
+        try:
+            contended = await self._hass.async_add_executor_job(self._file_lock.contended)
+            if contended:
+                # the CLI cannot log in next to our session
+                _LOGGER.debug("%s wanted by another process, logging out", self._ip)
+                async with self._lock:
+                    await self._async_logout()
+            release = contended or not self.logged_in
+        finally:
+            if release:
+                self._file_lock.release()
+            else:
+                self._async_watch_file_lock()
+
+    def _async_watch_file_lock(self) -> None:
+        if self._lock_watch is None or self._lock_watch.done():
+            self._lock_watch = self._hass.async_create_background_task(
+                self._async_hand_over_file_lock(), f"{DOMAIN} lock {self._ip}"
+            )
+
+    async def _async_hand_over_file_lock(self) -> None:
+        """Between two leases, log out as soon as another process waits."""
+        while self._file_lock.locked:
+            await asyncio.sleep(LOCK_WATCH_INTERVAL)
+            # a running lease checks on its own when it ends
+            if self._leases.held or not self._file_lock.locked:
+                continue
+            if not await self._hass.async_add_executor_job(self._file_lock.contended):
+                continue
+            await self._leases.acquire(PRIORITY_WRITE)
+            try:
+                if self._file_lock.locked:
+                    _LOGGER.debug("%s wanted by another process, logging out", self._ip)
+                    async with self._lock:
+                        await self._async_logout()
+                    self._file_lock.release()
+            finally:
+                self._leases.release()
+
+    async def async_call(self, method: str, *args):
+        """Run ``AsyncTL_WPA4220.<method>(*args)`` on the shared session."""
+        async with self.lease():
+            return await self._async_call(method, *args)
+
+    async def _async_call(self, method: str, *args):
+        device, generation = await self._async_ensure_login()
+        try:
+            return await getattr(device, method)(*args)
+        except Exception as err:
+            if not _session_rejected(err):
+                raise
+            _LOGGER.debug(
+                "Request %s on %s rejected (%s), logging in again", method, self._ip, err
+            )
+
+        device, _ = await self._async_ensure_login(stale=generation)
+        return await getattr(device, method)(*args)
+
+    async def async_ping(self, timeout: float | None = None) -> float:
+        """Liveness probe without login, returns the round trip in seconds.
+
+        Runs on its own client, so it neither waits for nor disturbs the
+        session; without ``timeout`` it shares the deadline of the poll.
+        """
+        probe = AsyncTL_WPA4220(
+            self._ip,
+            async_get_clientsession(self._hass),
+            timeout=timeout or AsyncTL_WPA4220.DEFAULT_TIMEOUT,
+            stats=self.stats,
+        )
+        if timeout is None:
+            probe.set_deadline(self._deadline)
+        return await probe.ping()
+
+    async def async_write(self, method: str, *args, invalidate: tuple[str, ...] = ()):
+        """Run a write and refetch the affected sections on the next poll.
+
+        Without ``invalidate`` every cached section is refetched.  Unlike
+        ``async_call`` a rejected write is not sent again after a new login:
+        the device may have applied it already.
+        """
+        try:
+            async with self.lease(PRIORITY_WRITE):
+                device, _ = await self._async_ensure_login()
+                return await getattr(device, method)(*args)
+        finally:
+            self.schedule.invalidate(*invalidate)
+
+    async def async_apply_capabilities(self, firmware_info) -> None:
+        """Skip the endpoints this model/firmware does not have.
+
+        The capability map comes from storage, or is probed once if the
+        model/firmware was not seen before.
+        """
+        key = AsyncTL_WPA4220.capability_key(firmware_info)
+        if key is None or key == self._capability_key:
+            return
+        store = CapabilityStore.async_get(self._hass)
+        unsupported = await store.async_lookup(key)
+        if unsupported is None:
+            try:
+                unsupported = await self.async_call("probe_capabilities")
+            except Exception as err:
+                # probed again on the next poll
+                _LOGGER.debug("Capability probe of %s failed: %s", self._ip, err)
+                return
+            _LOGGER.debug("Unsupported endpoints of %s: %s", key, unsupported)
+            await store.async_save(key, unsupported)
+        self._capability_key = key
+        self._unsupported = list(unsupported)
+        if self._device is not None:
+            self._device.set_unsupported_endpoints(self._unsupported)
+
+    async def async_close(self):
+        """Log out and drop the session (used on config entry unload).
+
+        Waits for a running poll or write, but not for the lock file.
+        """
+        if self._lock_watch is not None:
+            self._lock_watch.cancel()
+            self._lock_watch = None
+        await self._leases.acquire(PRIORITY_WRITE)
+        try:
+            async with self._lock:
+                await self._async_logout()
+        finally:
+            self._file_lock.release()
+            self._leases.release()
+
+    async def _async_ensure_login(self, stale: int | None = None):
+        async with self._lock:
+            if stale is not None and stale == self._generation:
+                await self._async_logout()
+            if not self.logged_in:
+                device = AsyncTL_WPA4220(
+                    self._ip, async_get_clientsession(self._hass), stats=self.stats
+                )
+                device.set_deadline(self._deadline)
+                _LOGGER.debug("Logging in to the device... %s", self._ip)
+                await device.login(self._password)
+                device.set_unsupported_endpoints(self._unsupported)
+                self._device = device
+                self._generation += 1
+                # firmware/model is read once per session
+                self.schedule.invalidate("FirmwareInfo")
+            return self._device, self._generation
+
+    async def _async_logout(self):
+        device, self._device = self._device, None
+        if device is None:
+            return
+        try:
+            if device.logged_in():
+                await device.logout()
+        except Exception as logout_error:
+            _LOGGER.debug("Logout error on %s: %s", self._ip, logout_error)
+        finally:
+            device.close()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# TL_WPA4220.py is also a standalone script; import it without Home Assistant
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'custom_components', 'tplink_wpa'))
@@ -0,0 +1,28 @@
+import logging
+
+import pytest
+
+from TL_WPA4220 import TL_WPA4220, install_cli_logging
+
+
+@pytest.fixture
+def client_logger():
+    logger = logging.getLogger(TL_WPA4220.__name__)
+    handlers, level = list(logger.handlers), logger.level
+    logger.handlers.clear()
+    yield logger
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+
+
+def test_clients_add_no_handlers(client_logger):
+    for _ in range(100):
+        TL_WPA4220('192.0.2.1').close()
+    assert client_logger.handlers == []
+
+
+def test_cli_handler_installed_once(client_logger):
+    for _ in range(100):
+        install_cli_logging()
+        TL_WPA4220('192.0.2.1').close()
+    assert len(client_logger.handlers) == 1
@@ -0,0 +1,55 @@
+import logging
+import tracemalloc
+
+import pytest
+
+from TL_WPA4220 import TL_WPA4220
+from TL_WPA4220_sim import SimConfig, SimServer
+
+POLLS = 2000
+WARMUP = 200
+LIMIT = 64 * 1024  # bytes
+
+
+@pytest.fixture
+def sim(request):
+    if request.config.pluginmanager.hasplugin('socket'):
+        # pytest-socket (pulled in by the Home Assistant test plugin)
+        request.getfixturevalue('socket_enabled')
+    config = SimConfig()
+    server = SimServer(('127.0.0.1', 0), config)
+    target = server.start()
+    yield target, config
+    server.shutdown()
+    server.server_close()
+
+
+def test_polls_do_not_leak(sim):
+    # a new client per poll, like the integration did before the session
+    target, config = sim
+    logger = logging.getLogger(TL_WPA4220.__name__)
+    handlers = list(logger.handlers)
+    client_files = [tracemalloc.Filter(True, '*TL_WPA4220.py'),
+                    tracemalloc.Filter(True, '*logging*')]
+
+    def poll():
+        device = TL_WPA4220(target)
+        device.login(config.password)
+        device.get_plc_device_status()
+        device.logout()
+        device.close()
+
+    tracemalloc.start()
+    try:
+        for _i in range(WARMUP):
+            poll()
+        before = tracemalloc.take_snapshot().filter_traces(client_files)
+        for _i in range(POLLS - WARMUP):
+            poll()
+        after = tracemalloc.take_snapshot().filter_traces(client_files)
+    finally:
+        tracemalloc.stop()
+
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    assert growth < LIMIT, after.compare_to(before, 'traceback')[:5]
+    assert logger.handlers == handlers